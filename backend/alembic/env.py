@@ -19,7 +19,7 @@ if config.config_file_name is not None:
 # from myapp import mymodel
 # target_metadata = mymodel.Base.metadata
 from app.models.base import Base  # or import from where your Base is
-from app.models import user, email, contact, contact_note, calendar_event, instruction, task, chat_session
+from app.models import user, email, contact, contact_note, calendar_event, instruction, task, chat_session, embedding_cache, document_chunk, gmail_sync_state, gmail_backfill
 target_metadata = Base.metadata
 
 # other values from the config, defined by the needs of env.py,
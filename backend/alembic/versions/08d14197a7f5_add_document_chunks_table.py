@@ -0,0 +1,50 @@
+"""Add document_chunks table
+
+Revision ID: 08d14197a7f5
+Revises: 14c906bb512e
+Create Date: 2026-10-18 20:05:41.583120
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from pgvector.sqlalchemy import Vector
+
+
+# revision identifiers, used by Alembic.
+revision: str = '08d14197a7f5'
+down_revision: Union[str, Sequence[str], None] = '14c906bb512e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('document_chunks',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('email_id', sa.Integer(), nullable=True),
+    sa.Column('contact_note_id', sa.Integer(), nullable=True),
+    sa.Column('chunk_index', sa.Integer(), nullable=False),
+    sa.Column('token_start', sa.Integer(), nullable=False),
+    sa.Column('token_end', sa.Integer(), nullable=False),
+    sa.Column('content', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('embedding', Vector(1536), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.ForeignKeyConstraint(['email_id'], ['emails.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['contact_note_id'], ['contact_notes.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_document_chunks_user_id'), 'document_chunks', ['user_id'], unique=False)
+    op.create_index(op.f('ix_document_chunks_email_id'), 'document_chunks', ['email_id'], unique=False)
+    op.create_index(op.f('ix_document_chunks_contact_note_id'), 'document_chunks', ['contact_note_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_document_chunks_contact_note_id'), table_name='document_chunks')
+    op.drop_index(op.f('ix_document_chunks_email_id'), table_name='document_chunks')
+    op.drop_index(op.f('ix_document_chunks_user_id'), table_name='document_chunks')
+    op.drop_table('document_chunks')
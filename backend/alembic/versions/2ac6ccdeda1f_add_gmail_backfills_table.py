@@ -0,0 +1,47 @@
+"""Add gmail backfills table
+
+Revision ID: 2ac6ccdeda1f
+Revises: 62797a579897
+Create Date: 2026-10-18 23:59:20.581634
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2ac6ccdeda1f'
+down_revision: Union[str, Sequence[str], None] = '62797a579897'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('gmail_backfills',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('status', sa.String(), nullable=True),
+    sa.Column('after', sa.Date(), nullable=True),
+    sa.Column('before', sa.Date(), nullable=True),
+    sa.Column('page_token', sa.String(), nullable=True),
+    sa.Column('pages', sa.Integer(), nullable=True),
+    sa.Column('messages_seen', sa.Integer(), nullable=True),
+    sa.Column('messages_stored', sa.Integer(), nullable=True),
+    sa.Column('elapsed_seconds', sa.Float(), nullable=True),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_gmail_backfills_user_id'), 'gmail_backfills', ['user_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_gmail_backfills_user_id'), table_name='gmail_backfills')
+    op.drop_table('gmail_backfills')
@@ -0,0 +1,48 @@
+"""Add HNSW indexes on embeddings
+
+Revision ID: 438987971fa1
+Revises: 08d14197a7f5
+Create Date: 2026-10-18 20:41:09.264817
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '438987971fa1'
+down_revision: Union[str, Sequence[str], None] = '08d14197a7f5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+EMBEDDING_TABLES = ['emails', 'contact_notes', 'document_chunks']
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Build concurrently so syncs can keep writing while large tables are indexed
+    with op.get_context().autocommit_block():
+        for table in ['emails', 'contact_notes']:
+            op.create_index(op.f(f'ix_{table}_user_id'), table, ['user_id'], unique=False,
+                            postgresql_concurrently=True, if_not_exists=True)
+        for table in EMBEDDING_TABLES:
+            # vector_ip_ops matches the `<#>` (negative inner product) operator used by retrieval
+            op.create_index(
+                f'ix_{table}_embedding_hnsw', table, ['embedding'], unique=False,
+                postgresql_using='hnsw',
+                postgresql_with={'m': 16, 'ef_construction': 64},
+                postgresql_ops={'embedding': 'vector_ip_ops'},
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for table in EMBEDDING_TABLES:
+            op.drop_index(f'ix_{table}_embedding_hnsw', table_name=table, postgresql_concurrently=True)
+        for table in ['emails', 'contact_notes']:
+            op.drop_index(op.f(f'ix_{table}_user_id'), table_name=table, postgresql_concurrently=True)
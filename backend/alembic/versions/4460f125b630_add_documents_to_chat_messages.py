@@ -0,0 +1,28 @@
+"""Add documents to chat_messages
+
+Revision ID: 4460f125b630
+Revises: 229f5952607e
+Create Date: 2026-10-18 23:27:15.640218
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4460f125b630'
+down_revision: Union[str, Sequence[str], None] = '229f5952607e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('chat_messages', sa.Column('documents', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('chat_messages', 'documents')
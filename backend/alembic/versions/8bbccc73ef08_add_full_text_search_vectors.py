@@ -0,0 +1,46 @@
+"""Add full-text search vectors
+
+Revision ID: 8bbccc73ef08
+Revises: 438987971fa1
+Create Date: 2026-10-18 21:17:52.640391
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8bbccc73ef08'
+down_revision: Union[str, Sequence[str], None] = '438987971fa1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('document_chunks', sa.Column(
+        'search_vector', postgresql.TSVECTOR(),
+        sa.Computed("to_tsvector('english', coalesce(content, ''))", persisted=True),
+        nullable=True,
+    ))
+    op.add_column('emails', sa.Column(
+        'search_vector', postgresql.TSVECTOR(),
+        sa.Computed(
+            "to_tsvector('english', coalesce(subject, '') || ' ' || coalesce(sender, '') || ' ' || coalesce(recipient, ''))",
+            persisted=True,
+        ),
+        nullable=True,
+    ))
+    op.create_index('ix_document_chunks_search_vector', 'document_chunks', ['search_vector'], unique=False, postgresql_using='gin')
+    op.create_index('ix_emails_search_vector', 'emails', ['search_vector'], unique=False, postgresql_using='gin')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_emails_search_vector', table_name='emails', postgresql_using='gin')
+    op.drop_index('ix_document_chunks_search_vector', table_name='document_chunks', postgresql_using='gin')
+    op.drop_column('emails', 'search_vector')
+    op.drop_column('document_chunks', 'search_vector')
@@ -0,0 +1,30 @@
+"""Add tool call columns to chat_messages
+
+Revision ID: af36ee5a4a56
+Revises: f604611c59ae
+Create Date: 2026-10-18 22:41:09.318274
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'af36ee5a4a56'
+down_revision: Union[str, Sequence[str], None] = 'f604611c59ae'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('chat_messages', sa.Column('tool_calls', sa.JSON(), nullable=True))
+    op.add_column('chat_messages', sa.Column('tool_call_id', sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('chat_messages', 'tool_call_id')
+    op.drop_column('chat_messages', 'tool_calls')
@@ -0,0 +1,66 @@
+"""Add body_text to emails
+
+Revision ID: f604611c59ae
+Revises: 8bbccc73ef08
+Create Date: 2026-10-18 21:58:26.104733
+
+"""
+from typing import Sequence, Union
+
+import base64
+import re
+import unicodedata
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f604611c59ae'
+down_revision: Union[str, Sequence[str], None] = '8bbccc73ef08'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 500
+
+
+def _decode(data: str) -> str:
+    # Only the raw part data was stored, so the declared charset is unknown
+    if not data:
+        return ""
+    raw = base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+    try:
+        text = raw.decode("utf-8")
+    except UnicodeDecodeError:
+        text = raw.decode("cp1252", errors="replace")
+    text = unicodedata.normalize("NFC", text).replace("\r\n", "\n").replace("\r", "\n")
+    text = re.sub(r"[ \t]+\n", "\n", text)
+    return re.sub(r"\n{3,}", "\n\n", text).strip()
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('emails', sa.Column('body_text', sa.Text(), nullable=True))
+
+    # Backfill existing rows in batches so large mailboxes don't load at once
+    conn = op.get_bind()
+    last_id = 0
+    while True:
+        rows = conn.execute(sa.text(
+            "SELECT id, body FROM emails WHERE id > :last_id ORDER BY id LIMIT :limit"
+        ), {"last_id": last_id, "limit": BATCH_SIZE}).fetchall()
+        if not rows:
+            break
+        updates = []
+        for row in rows:
+            try:
+                updates.append({"id": row.id, "body_text": _decode(row.body)})
+            except (ValueError, TypeError):
+                updates.append({"id": row.id, "body_text": ""})
+        conn.execute(sa.text("UPDATE emails SET body_text = :body_text WHERE id = :id"), updates)
+        last_id = rows[-1].id
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('emails', 'body_text')
@@ -6,7 +6,8 @@ from app.db.session import get_db
 from sqlalchemy.orm import Session
 import os
 import requests
-from app.services.email import sync_gmail_emails
+from app.services.ingestion import sync_gmail_emails
+from app.services.google_client import invalidate_google_clients
 from app.services.hubspot import sync_hubspot_data
 from sqlalchemy.orm import Session
 from fastapi.responses import JSONResponse
@@ -54,6 +55,7 @@ def google_callback(request: Request, db: Session = Depends(get_db), background_
     email = id_info["email"]
     user = User.get_or_create(db, email=email)
     user.update_google_tokens(db, credentials.token, credentials.refresh_token)
+    invalidate_google_clients(user.id)
 
     # Create JWT
     token = create_access_token({"sub": email})
@@ -1,32 +1,70 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, BackgroundTasks
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
-from sqlalchemy.sql import text
 
-from app.db.session import get_db
+from app.db.session import get_async_db, AsyncSessionLocal, SessionLocal
 from app.services.embedding import generate_embedding
-from app.models.task import Task
-from app.models.instruction import Instruction
+from app.services.retrieval import RetrievalService
+from app.core.context_packer import pack_context, get_context_budget, DELTA_CONTEXT_TOKEN_BUDGET
 from app.models.chat_session import ChatSession, ChatMessage
 
 from app.schemas.chat import ChatInput
 
-from app.core.tool_agent import call_tool, tool_schemas
+from app.core.tool_agent import openai_tools, parse_tool_calls, arun_tool_calls
+from app.core.unit_of_work import TurnUnitOfWork
+from app.core.turn_scheduler import TurnScheduler
+from app.core.history import load_history, history_messages, update_summary
+import asyncio
 import json
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
-from openai import OpenAI
+from openai import AsyncOpenAI
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
 chat_router = APIRouter(prefix="/chat", tags=["Chat"])
 
-@chat_router.post("/")
-def chat(input: ChatInput, db: Session = Depends(get_db)):
-    print("Received chat input:", input)
+CHAT_MODEL = os.getenv("CHAT_MODEL", "gpt-4o")
+
+SYSTEM_PROMPT = [
+    {"role": "system", "content": "You are an AI assistant for financial advisors."},
+    {"role": "system", "content": "You have access to recent emails and CRM notes. Use them to answer questions."},
+]
+
+
+def _ground_turn(user_id: int, user_message: str, injected: set) -> tuple[str, dict]:
+    """
+    Retrieve and pack the context for a turn, skipping documents already injected.
+
+    Embedding, the retrieval query (and local index scoring) and token counting
+    are all blocking, so this runs in a worker thread with its own sync session.
+    """
+    query_embedding = generate_embedding(user_message)
+    with SessionLocal() as sync_db:
+        hits = RetrievalService(sync_db).search(user_id, query_embedding, query_text=user_message)
+    new_hits = [hit for hit in hits if hit.key not in injected]
+    budget = get_context_budget(CHAT_MODEL)
+    if injected:
+        budget = min(budget, DELTA_CONTEXT_TOKEN_BUDGET)
+    context, context_stats = pack_context(new_hits, budget, model=CHAT_MODEL)
+    context_stats["reused_hits"] = len(hits) - len(new_hits)
+    return context, context_stats
+
+
+async def _start_turn(db: AsyncSession, input: ChatInput) -> tuple[int, list, dict, list]:
+    """
+    Find or create the chat session and build the prompt messages for a new user turn.
+
+    Returns:
+        tuple: The session id, the prompt messages, the context packing stats and
+        the ChatMessage rows the turn starts with (context delta and user message).
+    """
     user_id = input.user_id
     user_message = input.message
     session_id = input.session_id
@@ -34,150 +72,279 @@ def chat(input: ChatInput, db: Session = Depends(get_db)):
     # 1. Find or create chat session
     session = None
     if session_id:
-        session = db.query(ChatSession).filter_by(id=session_id, user_id=user_id).first()
+        session = await db.scalar(select(ChatSession).filter_by(id=session_id, user_id=user_id))
     if not session:
         session = ChatSession(user_id=user_id)
         db.add(session)
-        db.commit()
-        db.refresh(session)
+        await db.commit()
         session_id = session.id
 
-    # 2. Load chat history
-    history = (
-        db.query(ChatMessage)
-        .filter_by(session_id=session_id)
-        .order_by(ChatMessage.created_at)
-        .all()
-    )
-    messages = []
-    if not history:  # New session, inject system/context as first messages
-        # Generate context from RAG sources
-        query_embedding = generate_embedding(user_message)
-        emails = db.execute(text("""
-            SELECT subject, sender, recipient, body FROM emails
-            WHERE user_id = :user_id
-            ORDER BY embedding <#> (:embedding)::vector
-            LIMIT 5
-        """), {"user_id": user_id, "embedding": query_embedding}).fetchall()
-        formatted_emails = [
-            f"From: {row.sender}\nTo: {row.recipient}\nSubject: {row.subject}\n\n" +
-            base64.urlsafe_b64decode(row.body).decode("utf-8", errors="ignore")
-            for row in emails
-        ]
-        notes = db.execute(text("""
-            SELECT content FROM contact_notes
-            WHERE user_id = :user_id
-            ORDER BY embedding <#> (:embedding)::vector
-            LIMIT 5
-        """), {"user_id": user_id, "embedding": query_embedding}).fetchall()
-        instructions = db.query(Instruction).filter_by(user_id=user_id, active=True).all()
-        context = "\n\n".join(
-            formatted_emails +
-            [row[0] for row in notes] +
-            [f"Instruction: {i.condition} → {i.action}" for i in instructions]
-        )
-        messages = [
-            {"role": "system", "content": "You are an AI assistant for financial advisors."},
-            {"role": "system", "content": "You have access to recent emails and CRM notes. Use them to answer questions."},
-            {"role": "system", "content": f"Context data:\n\n{context}"}
-        ]
+    # 2. Load the chat history not yet folded into the session summary
+    history = await load_history(db, session)
+    injected = {key for row in history for key in (row.documents or [])}
 
+    # 3. Ground every turn, adding only documents the window does not already carry
+    context, context_stats = await asyncio.to_thread(_ground_turn, user_id, user_message, injected)
+
+    # Stable prefix first (system prompt, summary, earlier turns), then this turn's delta
+    messages = SYSTEM_PROMPT + history_messages(session.summary, history)
+    rows = []
+    if context:
+        content = f"Context data:\n\n{context}"
+        messages.append({"role": "system", "content": content})
+        rows.append(ChatMessage(session_id=session_id, role="system", content=content,
+                                documents=context_stats["documents"]))
         print('context messages:', context)
-    # Always append chat history (from DB)
-    messages += [
-        {"role": m.role, "content": m.content} if m.role != "function" else
-        {"role": "function", "name": m.name, "content": m.content}
-        for m in history
-    ]
-
-    # 3. Add current user message to history
+
+    # 4. Add current user message to history
     messages.append({"role": "user", "content": user_message})
-    db.add(ChatMessage(session_id=session_id, role="user", content=user_message))
-    db.commit()
+    rows.append(ChatMessage(session_id=session_id, role="user", content=user_message))
+    # End the read transaction so no connection is held while the model works
+    await db.commit()
+    return session_id, messages, context_stats, rows
+
+
+async def _run_tool_round(uow: TurnUnitOfWork, user_id: int, session_id: int, messages: list,
+                          content: str, tool_calls: list) -> list:
+    """
+    Execute one turn's tool calls and append the exchange to the prompt.
+
+    The assistant turn and each tool result are buffered in the unit of work;
+    when the round has side effects they are written before and after the tools run.
+
+    Returns:
+        list: The executed calls, with results, in call order.
+    """
+    messages.append({"role": "assistant", "content": content, "tool_calls": tool_calls})
+    uow.add(ChatMessage(session_id=session_id, role="assistant", content=content, tool_calls=tool_calls))
+
+    calls = parse_tool_calls(tool_calls, user_id)
+    await uow.before_tools(calls)
+    await arun_tool_calls(calls, uow.db)
+    for call in calls:
+        msg_content = json.dumps(call["result"])
+        messages.append({"role": "tool", "tool_call_id": call["id"], "content": msg_content})
+        uow.add(ChatMessage(session_id=session_id, role="tool", name=call["tool"],
+                            tool_call_id=call["id"], content=msg_content))
+    await uow.after_tools(calls)
+    return calls
+
+
+def _tool_call_result(call: dict) -> dict:
+    """A call as reported to the client, with its timing."""
+    return {
+        "tool": call["tool"],
+        "args": call["args"],
+        "result": call["result"],
+        "elapsed_ms": call.get("elapsed_ms", 0.0),
+        "timed_out": call.get("timed_out", False),
+    }
+
+
+def _sent_proposal(calls: list):
+    """The propose_times_email call that went out, if any."""
+    # Rejected, failed or timed-out proposals keep the loop going, so the model sees the error
+    return next((call for call in calls if call["tool"] in ["propose_times_email"] and call.get("ok")), None)
+
+
+def _record_tasks(uow: TurnUnitOfWork, user_id: int, session_id: int, messages: list, calls: list):
+    """Buffer the executed calls as tasks. Returns the pending task when times were proposed."""
+    # -- CRITICAL LOGIC --
+    # If this is a proposal to external contact (e.g., propose_times_email or send_email with available times)
+    proposal = _sent_proposal(calls)
+    if proposal:
+        # Save a "pending" scheduling task and stop the loop (do NOT create the event yet)
+        return uow.add_task(
+            user_id=user_id,
+            type="schedule_meeting",
+            status="waiting_for_response",
+            task_metadata={
+                "contact_email": proposal["args"].get("to"),
+                "proposed_times": proposal["args"].get("available_times"),
+                "session_id": session_id,
+                "context": list(messages),
+                "last_tool": proposal["tool"]
+            }
+        )
+    for call in calls:
+        uow.add_task(
+            user_id=user_id,
+            type=call["tool"],
+            task_metadata={"args": call["args"], "result": call["result"]}
+        )
+    return None
+
+
+def _proposal_response(calls: list) -> str:
+    proposal = _sent_proposal(calls)
+    return f"I've proposed times to {proposal['args'].get('to')}. I'll continue scheduling when they reply."
+
+
+@chat_router.post("/")
+async def chat(input: ChatInput, background_tasks: BackgroundTasks, db: AsyncSession = Depends(get_async_db)):
+    print("Received chat input:", input)
+    user_id = input.user_id
+    session_id, messages, context_stats, rows = await _start_turn(db, input)
+    background_tasks.add_task(update_summary, session_id)
+    uow = TurnUnitOfWork(db)
+    uow.add(*rows)
+    scheduler = TurnScheduler()
 
     tool_call_results = []
 
     while True:
-        response = client.chat.completions.create(
-            model="gpt-4o",
+        response = await client.chat.completions.create(
+            model=CHAT_MODEL,
             messages=messages,
-            functions=tool_schemas
+            tools=openai_tools,
+            **scheduler.next_round(messages)
         )
-        choice = response.choices[0]
-
-        if choice.finish_reason == "function_call":
-            fn = choice.message.function_call
-            tool_name = fn.name
-            args = json.loads(fn.arguments)
-            args["db"] = db
-            args["user_id"] = user_id
-
-            # -- CRITICAL LOGIC --
-            # If this is a proposal to external contact (e.g., propose_times_email or send_email with available times)
-            if tool_name in ["propose_times_email"]:
-                result = call_tool(tool_name, args)
-                # Save a "pending" scheduling task and stop the loop (do NOT create the event yet)
-                pending_task = Task.create(
-                    db=db,
-                    user_id=user_id,
-                    type="schedule_meeting",
-                    status="waiting_for_response",
-                    task_metadata={
-                        "contact_email": args.get("to"),
-                        "proposed_times": args.get("available_times"),
-                        "session_id": session_id,
-                        "context": messages,
-                        "last_tool": tool_name
-                    }
-                )
-                safe_args = dict(args)
-                safe_args.pop("db", None)
-                tool_call_results.append({"tool": tool_name, "args": safe_args, "result": result})
-
-                # Log tool call to chat history
-                msg_content = json.dumps(result)
-                messages.append({"role": "function", "name": tool_name, "content": msg_content})
-                db.add(ChatMessage(session_id=session_id, role="function", name=tool_name, content=msg_content))
-                db.commit()
+        scheduler.llm_done(response.usage)
+        message = response.choices[0].message
+
+        # The final round may not call tools; anything it asks for is ignored
+        if message.tool_calls and not scheduler.final:
+            # The model may request several tools at once; independent reads run concurrently
+            tool_calls = [tool_call.model_dump() for tool_call in message.tool_calls]
+            calls = await _run_tool_round(uow, user_id, session_id, messages, message.content, tool_calls)
+            scheduler.tools_done(calls)
+            tool_call_results += [_tool_call_result(call) for call in calls]
 
+            pending_task = _record_tasks(uow, user_id, session_id, messages, calls)
+            if pending_task:
+                await uow.checkpoint()
                 return {
-                    "response": (
-                        f"I've proposed times to {args.get('to')}. I'll continue scheduling when they reply."
-                    ),
+                    "response": _proposal_response(calls),
                     "tool_calls": tool_call_results,
                     "session_id": session_id,
-                    "pending_task_id": pending_task.id
+                    "pending_task_id": pending_task.id,
+                    "context_stats": context_stats,
+                    "turn_stats": scheduler.get_stats()
                 }
-
-            # Otherwise, continue as before
-            result = call_tool(tool_name, args)
-            safe_args = dict(args)
-            safe_args.pop("db", None)
-            Task.create(
-                db=db,
-                user_id=user_id,
-                type=tool_name,
-                task_metadata={"args": safe_args, "result": result}
-            )
-            tool_call_results.append({"tool": tool_name, "args": safe_args, "result": result})
-
-            # Add tool call to messages and persist to history
-            msg_content = json.dumps(result)
-            messages.append({"role": "function", "name": tool_name, "content": msg_content})
-            db.add(ChatMessage(session_id=session_id, role="function", name=tool_name, content=msg_content))
-            db.commit()
             continue
 
         else:
-            db.add(ChatMessage(session_id=session_id, role="assistant", content=choice.message.content))
-            db.commit()
+            uow.add(ChatMessage(session_id=session_id, role="assistant", content=message.content))
+            await uow.checkpoint()
+            print("Turn stats:", scheduler.get_stats())
             return {
-                "response": choice.message.content,
+                "response": message.content,
                 "tool_calls": tool_call_results,
-                "session_id": session_id
+                "session_id": session_id,
+                "context_stats": context_stats,
+                "turn_stats": scheduler.get_stats()
             }
 
 
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+async def _stream_turn(user_id: int, session_id: int, rows: list, messages: list, context_stats: dict):
+    """
+    Run the tool loop with streamed completions, yielding server-sent events.
+
+    Events: "retrieval" once the context is ready, "tool_call" and "tool_result"
+    around every tool, "round" with the timing of each tool round, "token" for
+    each piece of assistant text and "done" at the end. Rows are buffered in a
+    TurnUnitOfWork and budgets enforced by a TurnScheduler, like in chat().
+    """
+    # The request's session is closed before the response body is streamed
+    db = AsyncSessionLocal()
+    try:
+        uow = TurnUnitOfWork(db)
+        uow.add(*rows)
+        scheduler = TurnScheduler()
+        tool_call_results = []
+        yield _sse("retrieval", {"session_id": session_id, "context_stats": context_stats})
+
+        while True:
+            stream = await client.chat.completions.create(
+                model=CHAT_MODEL,
+                messages=messages,
+                tools=openai_tools,
+                stream=True,
+                # Token usage arrives in a last chunk without choices
+                stream_options={"include_usage": True},
+                **scheduler.next_round(messages)
+            )
+            content, tool_calls, usage = [], {}, None
+            async for chunk in stream:
+                usage = chunk.usage or usage
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta
+                if delta.content:
+                    content.append(delta.content)
+                    yield _sse("token", {"content": delta.content})
+                # Tool calls arrive as fragments keyed by their position in the turn
+                for fragment in delta.tool_calls or []:
+                    tool_call = tool_calls.setdefault(fragment.index, {
+                        "id": "", "type": "function", "function": {"name": "", "arguments": ""}
+                    })
+                    tool_call["id"] = fragment.id or tool_call["id"]
+                    if fragment.function:
+                        tool_call["function"]["name"] += fragment.function.name or ""
+                        tool_call["function"]["arguments"] += fragment.function.arguments or ""
+            scheduler.llm_done(usage)
+
+            if not tool_calls or scheduler.final:
+                response = "".join(content)
+                uow.add(ChatMessage(session_id=session_id, role="assistant", content=response))
+                await uow.checkpoint()
+                print("Turn stats:", scheduler.get_stats())
+                yield _sse("done", {
+                    "response": response,
+                    "tool_calls": tool_call_results,
+                    "session_id": session_id,
+                    "context_stats": context_stats,
+                    "turn_stats": scheduler.get_stats()
+                })
+                return
+
+            tool_calls = [tool_calls[index] for index in sorted(tool_calls)]
+            for call in parse_tool_calls(tool_calls, user_id):
+                yield _sse("tool_call", {"id": call["id"], "tool": call["tool"], "args": call["args"]})
+            calls = await _run_tool_round(uow, user_id, session_id, messages, "".join(content) or None, tool_calls)
+            scheduler.tools_done(calls)
+            yield _sse("round", scheduler.get_stats()["rounds"][-1])
+            for call in calls:
+                tool_call_results.append(_tool_call_result(call))
+                yield _sse("tool_result", {"id": call["id"], **_tool_call_result(call)})
+
+            pending_task = _record_tasks(uow, user_id, session_id, messages, calls)
+            if pending_task:
+                # Wait for the contact's reply instead of continuing the loop
+                await uow.checkpoint()
+                yield _sse("done", {
+                    "response": _proposal_response(calls),
+                    "tool_calls": tool_call_results,
+                    "session_id": session_id,
+                    "pending_task_id": pending_task.id,
+                    "context_stats": context_stats,
+                    "turn_stats": scheduler.get_stats()
+                })
+                return
+    except Exception as e:
+        print("Chat stream failed:", e)
+        await db.rollback()
+        yield _sse("error", {"detail": str(e)})
+    finally:
+        await db.close()
+
+
+@chat_router.post("/stream")
+async def chat_stream(input: ChatInput, db: AsyncSession = Depends(get_async_db)):
+    """Same turn as POST /chat/, streamed as server-sent events."""
+    print("Received chat input:", input)
+    session_id, messages, context_stats, rows = await _start_turn(db, input)
+    return StreamingResponse(
+        _stream_turn(input.user_id, session_id, rows, messages, context_stats),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(update_summary, session_id)
+    )
+
 import base64
 from email import message_from_bytes
 
@@ -0,0 +1,25 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from app.schemas.email import BackfillInput
+from app.models.gmail_backfill import GmailBackfill
+from app.db.session import get_db
+from app.services.gmail_backfill import start_backfill, launch_backfill
+
+emails_router = APIRouter(prefix="/emails", tags=["Emails"])
+
+
+@emails_router.post("/backfill")
+def create_backfill(input: BackfillInput, db: Session = Depends(get_db)):
+    """Start a Gmail backfill, or resume the user's unfinished one (or a failed one over the same window)."""
+    backfill = start_backfill(db, input.user_id, after=input.after, before=input.before)
+    launch_backfill(backfill.id)
+    return backfill.to_dict()
+
+
+@emails_router.get("/backfill/{backfill_id}")
+def get_backfill(backfill_id: int, db: Session = Depends(get_db)):
+    """Progress of a backfill, including its throughput in messages per second."""
+    backfill = db.get(GmailBackfill, backfill_id)
+    if not backfill:
+        raise HTTPException(status_code=404, detail="Backfill not found")
+    return backfill.to_dict()
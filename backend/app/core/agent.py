@@ -1,8 +1,10 @@
-import json
 from app.models.task import Task
-from app.core.tool_agent import call_tool, tool_schemas
+from app.core.tool_agent import call_tool, openai_tools, parse_tool_calls, run_tool_calls
 from app.models.instruction import Instruction
 from app.models.email import Email
+from app.services.embedding import generate_embedding
+from app.services.retrieval import RetrievalService
+from app.core.context_packer import pack_context, get_context_budget
 import os
 from dotenv import load_dotenv
 
@@ -29,23 +31,33 @@ def continue_task(task, event, db):
         {"role": "assistant", "content": meta.get("proposal_message", "")},  # The email you sent
         {"role": "user", "content": reply_content}
     ]
-    # 2. Call LLM with tool_schemas enabled
+    if reply_content:
+        # Ground the reply in related emails, notes and instructions
+        hits = RetrievalService(db).search(
+            task.user_id, generate_embedding(reply_content), email_k=5, note_k=5, query_text=reply_content
+        )
+        if hits:
+            context, _ = pack_context(hits, get_context_budget("gpt-4o"), model="gpt-4o")
+            messages.insert(1, {"role": "system", "content": f"Context data:\n\n{context}"})
+    # 2. Call LLM with tools enabled
     response = client.chat.completions.create(
         model="gpt-4o",
         messages=messages,
-        functions=tool_schemas
+        tools=openai_tools
     )
-    choice = response.choices[0]
-    if choice.finish_reason == "function_call":
-        fn = choice.message.function_call
-        tool_name = fn.name
-        args = json.loads(fn.arguments)
-        args["db"] = db
-        args["user_id"] = task.user_id
-        call_tool(tool_name, args)
+    message = response.choices[0].message
+    if message.tool_calls:
+        tool_calls = [tool_call.model_dump() for tool_call in message.tool_calls]
+        calls = run_tool_calls(parse_tool_calls(tool_calls, task.user_id), db)
+        failed = [call for call in calls if not call.get("ok")]
+        if failed:
+            # Leave the task pending so the next event can retry it
+            errors = "; ".join(f"{call['tool']}: {call['result']['error']}" for call in failed)
+            return {"result": f"Task not completed: {errors}"}
         task.status = "completed"
         db.commit()
-        return {"result": f"{tool_name} completed and task marked as complete."}
+        tool_names = ", ".join(call["tool"] for call in calls)
+        return {"result": f"{tool_names} completed and task marked as complete."}
     else:
         # LLM says it can't proceed
         return {"result": "No action taken, waiting for more info."}
@@ -0,0 +1,108 @@
+import os
+import re
+import hashlib
+from app.utils.tokens import get_encoding
+
+# Prompt tokens reserved for retrieved context, per chat model.
+# Override with e.g. CONTEXT_TOKEN_BUDGETS="gpt-4o=8000,gpt-4o-mini=3000".
+CONTEXT_TOKEN_BUDGETS = {
+    "gpt-4o": 6000,
+    "gpt-4o-mini": 4000,
+}
+DEFAULT_CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "4000"))
+for _entry in filter(None, os.getenv("CONTEXT_TOKEN_BUDGETS", "").split(",")):
+    _model, _budget = _entry.split("=")
+    CONTEXT_TOKEN_BUDGETS[_model.strip()] = int(_budget)
+
+# Cap for follow-up turns, which only add documents the conversation does not already carry
+DELTA_CONTEXT_TOKEN_BUDGET = int(os.getenv("DELTA_CONTEXT_TOKEN_BUDGET", "2000"))
+
+# Longest single snippet, and the smallest remainder worth filling with a trimmed snippet
+MAX_SNIPPET_TOKENS = int(os.getenv("CONTEXT_MAX_SNIPPET_TOKENS", "800"))
+MIN_SNIPPET_TOKENS = 64
+
+SEPARATOR = "\n\n"
+
+
+def get_context_budget(model: str) -> int:
+    return CONTEXT_TOKEN_BUDGETS.get(model, DEFAULT_CONTEXT_TOKEN_BUDGET)
+
+
+def _fingerprint(text: str) -> str:
+    return hashlib.sha1(re.sub(r"\s+", " ", text).strip().lower().encode("utf-8")).hexdigest()
+
+
+def pack_context(hits: list, budget: int, model: str = "gpt-4o") -> tuple[str, dict]:
+    """
+    Fit ranked retrieval hits into a token budget.
+
+    Instructions are packed first since they are short rules the user set up.
+    The remaining hits are trimmed to MAX_SNIPPET_TOKENS, deduplicated by
+    normalised text and added greedily by score per token until the budget is
+    spent. A hit that no longer fits is trimmed into the remaining space when
+    at least MIN_SNIPPET_TOKENS are left.
+
+    Args:
+        hits (list[RetrievalHit]): Ranked hits from RetrievalService.
+        budget (int): Maximum number of tokens for the packed context.
+        model (str): Chat model whose tokenizer is used for counting.
+
+    Returns:
+        tuple: The packed context text and a dict of packing stats, including the
+        keys of the packed documents under "documents".
+    """
+    enc = get_encoding(model)
+    separator_tokens = len(enc.encode(SEPARATOR))
+    stats = {
+        "budget": budget,
+        "packed_hits": 0,
+        "packed_tokens": 0,
+        "dropped_hits": 0,
+        "dropped_tokens": 0,
+        "trimmed_tokens": 0,
+        "duplicate_hits": 0,
+        "documents": [],
+    }
+
+    candidates = []
+    seen = set()
+    for hit in hits:
+        text = hit.to_context()
+        fingerprint = _fingerprint(text)
+        tokens = enc.encode(text)
+        if fingerprint in seen:
+            stats["duplicate_hits"] += 1
+            stats["dropped_tokens"] += len(tokens)
+            continue
+        seen.add(fingerprint)
+        if len(tokens) > MAX_SNIPPET_TOKENS:
+            stats["trimmed_tokens"] += len(tokens) - MAX_SNIPPET_TOKENS
+            tokens = tokens[:MAX_SNIPPET_TOKENS]
+        candidates.append((hit, tokens))
+
+    # Instructions first, then by score per token
+    candidates.sort(key=lambda c: (
+        c[0].source != "instruction",
+        -((c[0].score or 0.0) / max(len(c[1]), 1)),
+    ))
+
+    snippets = []
+    remaining = budget
+    for hit, tokens in candidates:
+        cost = len(tokens) + (separator_tokens if snippets else 0)
+        if cost > remaining:
+            room = remaining - (separator_tokens if snippets else 0)
+            if room < MIN_SNIPPET_TOKENS:
+                stats["dropped_hits"] += 1
+                stats["dropped_tokens"] += len(tokens)
+                continue
+            stats["trimmed_tokens"] += len(tokens) - room
+            tokens = tokens[:room]
+            cost = remaining
+        snippets.append(enc.decode(tokens))
+        remaining -= cost
+        stats["packed_hits"] += 1
+        stats["documents"].append(hit.key)
+        stats["packed_tokens"] += len(tokens)
+
+    return SEPARATOR.join(snippets), stats
@@ -0,0 +1,162 @@
+import os
+from openai import AsyncOpenAI
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.session import AsyncSessionLocal
+from app.models.chat_session import ChatSession, ChatMessage
+from dotenv import load_dotenv
+
+load_dotenv()
+
+client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+# Messages replayed verbatim on every turn; older ones are folded into the summary
+HISTORY_WINDOW = int(os.getenv("CHAT_HISTORY_WINDOW", "20"))
+# Fold only once this many messages have left the window, and at most this many per update
+SUMMARY_MIN_MESSAGES = int(os.getenv("CHAT_SUMMARY_MIN_MESSAGES", "10"))
+SUMMARY_MAX_MESSAGES = int(os.getenv("CHAT_SUMMARY_MAX_MESSAGES", "60"))
+SUMMARY_MODEL = os.getenv("CHAT_SUMMARY_MODEL", "gpt-4o-mini")
+# Tool results can be large JSON blobs; the summary only needs their gist
+SUMMARY_LINE_CHARS = 1000
+
+MESSAGE_COLUMNS = (
+    ChatMessage.id,
+    ChatMessage.role,
+    ChatMessage.name,
+    ChatMessage.content,
+    ChatMessage.tool_calls,
+    ChatMessage.tool_call_id,
+    ChatMessage.documents,
+)
+
+
+async def load_window(db: AsyncSession, session_id: int, size: int = HISTORY_WINDOW,
+                      summarized_until: int = None) -> list:
+    """
+    Load the newest messages of a session as plain rows, oldest first.
+
+    Args:
+        size (int): How many messages to load.
+        summarized_until (int): Skip messages up to this id, already in the summary.
+
+    Returns:
+        list: Rows with the MESSAGE_COLUMNS attributes. The window never opens
+        on tool results whose assistant turn fell outside it, and never holds
+        tool calls without their results.
+    """
+    query = select(*MESSAGE_COLUMNS).where(ChatMessage.session_id == session_id)
+    if summarized_until is not None:
+        query = query.where(ChatMessage.id > summarized_until)
+    rows = (await db.execute(query.order_by(ChatMessage.id.desc()).limit(size))).all()
+    rows.reverse()
+    while rows and rows[0].role == "tool":
+        rows.pop(0)
+    return _drop_unanswered(rows)
+
+
+def _drop_unanswered(rows: list) -> list:
+    """
+    Drop assistant tool_calls turns that lack any of their tool results, with the results they have.
+
+    A turn that failed between its tool calls and their results would otherwise
+    be replayed as a request the API rejects, breaking the session for good.
+    """
+    answered = {row.tool_call_id for row in rows if row.role == "tool"}
+    dropped = set()
+    kept = []
+    for row in rows:
+        if row.role == "assistant" and row.tool_calls:
+            ids = {tool_call["id"] for tool_call in row.tool_calls}
+            if not ids <= answered:
+                dropped |= ids
+                continue
+        if row.role == "tool" and row.tool_call_id in dropped:
+            continue
+        kept.append(row)
+    return kept
+
+
+async def load_history(db: AsyncSession, chat_session: ChatSession) -> list:
+    """
+    Rows to replay in the prompt: the window, plus the messages before it that
+    have not been folded into the summary yet.
+
+    update_summary only folds once SUMMARY_MIN_MESSAGES have left the window, so
+    up to that many extra messages are replayed instead of being dropped.
+    """
+    return await load_window(db, chat_session.id, size=HISTORY_WINDOW + SUMMARY_MIN_MESSAGES,
+                             summarized_until=chat_session.summary_message_id)
+
+
+def history_messages(summary: str, rows: list) -> list[dict]:
+    """The summary (when there is one) followed by the window, as prompt messages."""
+    messages = []
+    if summary:
+        messages.append({"role": "system", "content": f"Summary of the earlier conversation:\n\n{summary}"})
+    return messages + [ChatMessage.to_message(row) for row in rows]
+
+
+def _transcript_line(row) -> str:
+    if row.role == "assistant" and row.tool_calls and not row.content:
+        names = ", ".join(tool_call["function"]["name"] for tool_call in row.tool_calls)
+        return f"assistant: (called {names})"
+    speaker = f"{row.role} {row.name}" if row.name else row.role
+    return f"{speaker}: {(row.content or '')[:SUMMARY_LINE_CHARS]}"
+
+
+async def update_summary(session_id: int):
+    """
+    Fold messages that have left the history window into the session's summary.
+
+    Runs as a background task after a turn. The previous summary is extended
+    with the new messages only, so each update costs a bounded number of tokens.
+    """
+    try:
+        async with AsyncSessionLocal() as db:
+            chat_session = await db.get(ChatSession, session_id)
+            window = await load_window(db, session_id)
+            if not chat_session or not window:
+                return
+            previous_id = chat_session.summary_message_id
+            rows = (await db.execute(
+                select(*MESSAGE_COLUMNS)
+                .where(
+                    ChatMessage.session_id == session_id,
+                    ChatMessage.id > (previous_id or 0),
+                    ChatMessage.id < window[0].id,
+                )
+                .order_by(ChatMessage.id)
+                .limit(SUMMARY_MAX_MESSAGES)
+            )).all()
+            await db.commit()
+            if len(rows) < SUMMARY_MIN_MESSAGES:
+                return
+
+            # Retrieved context is re-fetched on demand, so it is left out of the summary
+            transcript = "\n".join(_transcript_line(row) for row in rows if row.role != "system")
+            response = await client.chat.completions.create(
+                model=SUMMARY_MODEL,
+                messages=[
+                    {"role": "system", "content": (
+                        "You maintain a running summary of a conversation between a financial advisor "
+                        "and their AI assistant. Keep names, email addresses, dates, amounts, decisions "
+                        "and open requests. Reply with the updated summary only."
+                    )},
+                    {"role": "user", "content": (
+                        f"Current summary:\n{chat_session.summary or '(none)'}\n\nNew messages:\n{transcript}"
+                    )},
+                ],
+            )
+
+            # Another update may have won the race; only apply on top of the summary we read
+            await db.execute(
+                update(ChatSession)
+                .where(
+                    ChatSession.id == session_id,
+                    ChatSession.summary_message_id.is_not_distinct_from(previous_id),
+                )
+                .values(summary=response.choices[0].message.content, summary_message_id=rows[-1].id)
+            )
+            await db.commit()
+    except Exception as e:
+        print("Chat summary update failed:", e)
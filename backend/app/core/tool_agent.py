@@ -1,158 +1,127 @@
+import asyncio
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Any
-from app.services.email import send_email, propose_times_email
-from app.services.calendar import create_event, find_free_times, get_upcoming_meetings
-from app.services.hubspot import create_contact, add_note_to_hubspot, find_contact
+# Imported for their @tool registrations
+import app.services.email
+import app.services.calendar
+import app.services.hubspot
 from app.models.instruction import Instruction
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.session import SessionLocal
+from app.core.tool_cache import tool_cache
+from app.core.tool_engine import ToolEngine, ToolResult
+from app.core.tool_registry import TOOL_REGISTRY, ToolArgumentError, tool, validate_args
 
-# Tool function registry
-TOOLS = {
-    "send_email": send_email,
-    "create_event": create_event,
-    "create_contact": create_contact,
-    "add_note_to_hubspot": add_note_to_hubspot,
-    "add_instruction": lambda condition, action, user_id, db=None: add_instruction(condition, action, user_id, db),
-    "find_contact": find_contact,
-    "find_free_times": find_free_times,
-    "get_upcoming_meetings": get_upcoming_meetings,
-    "propose_times_email": propose_times_email,
-}
-
-# Tool schemas for OpenAI API
-tool_schemas = [
-    {
-        "name": "send_email",
-        "description": "Send an email via Gmail",
-        "parameters": {
-            "type": "object",
-            "properties": {
-                "to": {"type": "string", "description": "Email address of the recipient"},
-                "subject": {"type": "string", "description": "Subject of the email"},
-                "body": {"type": "string", "description": "Body of the email"}
-            },
-            "required": ["to", "subject", "body"]
-        }
-    },
-    {
-        "name": "create_event",
-        "description": "Create a Google Calendar event",
-        "parameters": {
-            "type": "object",
-            "properties": {
-                "user_id": {"type": "integer"},
-                "title": {"type": "string"},
-                "start_time": {"type": "string", "description": "ISO 8601 start time"},
-                "end_time": {"type": "string", "description": "ISO 8601 end time"},
-                "attendees": {
-                    "type": "array",
-                    "items": {"type": "string"},
-                    "description": "List of email addresses"
-                }
-            },
-            "required": ["user_id", "title", "start_time", "end_time", "attendees"]
-        }
-    },
-    {
-        "name": "create_contact",
-        "description": "Create a contact in HubSpot",
-        "parameters": {
-            "type": "object",
-            "properties": {
-                "name": {"type": "string"},
-                "email": {"type": "string"},
-                "phone": {"type": "string"},
-                "company": {"type": "string"}
-            },
-            "required": ["email"]
-        }
-    },
-    {
-        "name": "add_note_to_hubspot",
-        "description": "Attach a note to a HubSpot contact",
-        "parameters": {
-            "type": "object",
-            "properties": {
-                "contact_id": {"type": "string"},
-                "content": {"type": "string"}
-            },
-            "required": ["contact_id", "content"]
-        }
-    },
-    {
-        "name": "add_instruction",
-        "description": "Add a new ongoing automation rule",
-        "parameters": {
-            "type": "object",
-            "properties": {
-                "condition": {
-                    "type": "string",
-                    "description": "Trigger condition, e.g. 'email from unknown sender'"
-                },
-                "action": {
-                    "type": "string",
-                    "description": "Action to take, e.g. 'create contact and note in HubSpot'"
-                }
-            },
-            "required": ["condition", "action"]
-        }
-    },
-    {
-        "name": "find_contact",
-        "description": "Finds a contact by name or email in HubSpot/CRM.",
-        "parameters": {
-            "type": "object",
-            "properties": {
-                "name": {"type": "string"},
-                "email": {"type": "string"}
-            }
-        }
-    },
-    {
-        "name": "find_free_times",
-        "description": "Finds available times for a meeting.",
-        "parameters": {
-            "type": "object",
-            "properties": {
-                "user_id": {"type": "integer"},
-                "date_range": {"type": "string"}
-            },
-            "required": ["user_id"]
-        }
-    },
-    {
-        "name": "get_upcoming_meetings",
-        "description": "Gets upcoming meetings for a contact.",
-        "parameters": {
-            "type": "object",
-            "properties": {
-                "user_id": {"type": "integer"},
-                "contact_email": {"type": "string"}
-            },
-            "required": ["user_id", "contact_email"]
-        }
-    },
-    {
-        "name": "propose_times_email",
-        "description": "Send an email with available meeting times.",
-        "parameters": {
-            "type": "object",
-            "properties": {
-                "to": {"type": "string"},
-                "available_times": {"type": "array", "items": {"type": "string"}},
-                "body": {"type": "string"}
-            },
-            "required": ["to", "available_times", "body"]
-        }
-    }
-]
-
+@tool("Add a new ongoing automation rule", params={
+    "condition": "Trigger condition, e.g. 'email from unknown sender'",
+    "action": "Action to take, e.g. 'create contact and note in HubSpot'",
+})
 def add_instruction(condition: str, action: str, user_id: int, db: Session = None):
     instruction = Instruction(condition=condition, action=action, user_id=user_id, active=True)
     db.add(instruction)
     db.commit()
     return f"Instruction added: when '{condition}', do '{action}'."
 
+# Tool function registry and schemas for OpenAI API, generated by the @tool
+# decorators of the services imported above
+TOOLS = {name: spec.func for name, spec in TOOL_REGISTRY.items()}
+tool_schemas = [spec.schema for spec in TOOL_REGISTRY.values()]
+
+# Same schemas in the `tools` format, which lets the model request several calls per turn
+openai_tools = [{"type": "function", "function": schema} for schema in tool_schemas]
+
+# Tools that only read data; consecutive calls to them run side by side
+READ_ONLY_TOOLS = {name for name, spec in TOOL_REGISTRY.items() if spec.read_only}
+
+# Shared, bounded pool for blocking tool calls; per-integration limits are
+# enforced inside it by the tool engine
+TOOL_MAX_WORKERS = int(os.getenv("TOOL_MAX_WORKERS", "16"))
+tool_executor = ThreadPoolExecutor(max_workers=TOOL_MAX_WORKERS, thread_name_prefix="tool")
+tool_engine = ToolEngine(tool_executor)
+
+# Waits on concurrent read-only batches in run_tool_calls. Kept apart from
+# tool_executor so waiting never takes a slot a tool needs to run.
+_batch_executor = ThreadPoolExecutor(max_workers=TOOL_MAX_WORKERS, thread_name_prefix="tool-batch")
+
+async def add_instruction_async(condition: str, action: str, user_id: int, db: AsyncSession = None):
+    instruction = Instruction(condition=condition, action=action, user_id=user_id, active=True)
+    db.add(instruction)
+    await db.commit()
+    return f"Instruction added: when '{condition}', do '{action}'."
+
+# Native coroutine versions of tools, used by aexecute_tool instead of the TOOLS entry
+ASYNC_TOOLS = {
+    "add_instruction": add_instruction_async,
+}
+
+def execute_tool(tool_name: str, args: Dict[str, Any]) -> ToolResult:
+    """
+    Run a tool under its integration's policy and return a ToolResult.
+
+    Repeated read-only lookups are answered from the TTL cache. Read-only tools
+    are retried on failure; tools with side effects run once. The call runs in
+    a worker thread with its own session, so args["db"] is not used.
+    """
+    spec = TOOL_REGISTRY.get(tool_name)
+    if spec is None:
+        return ToolResult(tool=tool_name, ok=False, error=f"Unknown tool: {tool_name}")
+
+    found, value = tool_cache.lookup(tool_name, args)
+    if found:
+        return ToolResult(tool=tool_name, ok=True, value=value, cached=True)
+    result = tool_engine.run(tool_name, lambda: _call_in_thread(tool_name, args),
+                             integration=spec.integration, retry=spec.read_only)
+    return _settle(spec, args, result)
+
+async def aexecute_tool(tool_name: str, args: Dict[str, Any]) -> ToolResult:
+    """
+    Async counterpart of execute_tool; args["db"] is an AsyncSession.
+
+    Coroutine tools are awaited on the loop with that session. The remaining
+    tools wrap blocking Google/HubSpot clients, so they run in a worker thread
+    with their own sync session while the event loop keeps serving other chats.
+    """
+    spec = TOOL_REGISTRY.get(tool_name)
+    if spec is None:
+        return ToolResult(tool=tool_name, ok=False, error=f"Unknown tool: {tool_name}")
+
+    # Checked here so cache hits skip the worker thread entirely
+    found, value = tool_cache.lookup(tool_name, args)
+    if found:
+        return ToolResult(tool=tool_name, ok=True, value=value, cached=True)
+    async_func = ASYNC_TOOLS.get(tool_name)
+    if async_func is not None:
+        result = await tool_engine.arun(tool_name, lambda: _ainvoke(async_func, tool_name, args),
+                                        integration=spec.integration, retry=spec.read_only, coroutine=True)
+    else:
+        result = await tool_engine.arun(tool_name, lambda: _call_in_thread(tool_name, args),
+                                        integration=spec.integration, retry=spec.read_only)
+    return _settle(spec, args, result)
+
+def _settle(spec, args: Dict[str, Any], result: ToolResult) -> ToolResult:
+    """Update the cache from a result; flag write tools that timed out as possibly done."""
+    if result.ok:
+        tool_cache.store(spec.name, args, result.value)
+    elif result.timed_out and not spec.read_only:
+        # The call keeps running in its worker thread and may still send the
+        # email or create the event; a retry could do it twice
+        result.outcome_unknown = True
+        result.error = (f"`{spec.name}` did not finish in time and may still complete. "
+                        "Do not retry it; tell the user the outcome is unknown.")
+        tool_cache.invalidate(spec.name, args)
+    return result
+
 def call_tool(tool_name: str, args: Dict[str, Any]) -> Any:
+    """Run a tool and return its value, raising ValueError if it failed or timed out."""
+    result = execute_tool(tool_name, args)
+    if not result.ok:
+        raise ValueError(result.error)
+    return result.value
+
+def _invoke(tool_name: str, args: Dict[str, Any]) -> Any:
     try:
         tool_func = TOOLS[tool_name]
     except KeyError:
@@ -162,3 +131,93 @@ def call_tool(tool_name: str, args: Dict[str, Any]) -> Any:
         return tool_func(**args)
     except TypeError as e:
         raise ValueError(f"Invalid arguments for `{tool_name}`: {e}")
+
+async def _ainvoke(tool_func, tool_name: str, args: Dict[str, Any]) -> Any:
+    try:
+        return await tool_func(**args)
+    except TypeError as e:
+        raise ValueError(f"Invalid arguments for `{tool_name}`: {e}")
+
+def _call_in_thread(tool_name: str, args: Dict[str, Any]) -> Any:
+    # Sessions are not thread-safe, so each worker call gets its own
+    with SessionLocal() as db:
+        result = _invoke(tool_name, {**args, "db": db})
+    if tool_name not in READ_ONLY_TOOLS:
+        # Also covers writes that finish after the caller stopped waiting
+        tool_cache.invalidate(tool_name, args)
+    return result
+
+def _record(call: dict, result: ToolResult):
+    call["result"] = result.payload()
+    call["ok"] = result.ok
+    call["elapsed_ms"] = round(result.elapsed_ms, 1)
+    call["attempts"] = result.attempts
+    call["timed_out"] = result.timed_out
+    call["outcome_unknown"] = result.outcome_unknown
+    call["cached"] = result.cached
+
+def parse_tool_calls(tool_calls: List[dict], user_id: int) -> List[dict]:
+    """
+    Turn the model's tool calls into validated call dicts: id, tool, args (with user_id set).
+
+    Calls that fail validation are not dispatched. They get an "error" and a
+    {"error": ...} result, which goes back to the model in the same turn.
+
+    Args:
+        tool_calls (List[dict]): Tool calls in the chat completions message format.
+        user_id (int): The user the tools act for; overrides any value the model sent.
+    """
+    calls = []
+    for tool_call in tool_calls:
+        call = {"id": tool_call["id"], "tool": tool_call["function"]["name"], "args": {}}
+        try:
+            args = json.loads(tool_call["function"]["arguments"] or "{}")
+            if not isinstance(args, dict):
+                raise ToolArgumentError(f"Arguments for `{call['tool']}` must be a JSON object")
+            call["args"] = validate_args(call["tool"], args)
+        except (ValueError, ToolArgumentError) as e:
+            call["error"] = str(e)
+            call["result"] = {"error": str(e)}
+        call["args"]["user_id"] = user_id
+        calls.append(call)
+    return calls
+
+def _batches(calls: List[dict]):
+    """Group consecutive read-only calls; every other call runs on its own, in order."""
+    batch = []
+    for call in calls:
+        if "error" in call:
+            continue  # rejected by validation, never dispatched
+        if call["tool"] in READ_ONLY_TOOLS:
+            batch.append(call)
+            continue
+        if batch:
+            yield batch
+            batch = []
+        yield [call]
+    if batch:
+        yield batch
+
+def run_tool_calls(calls: List[dict], db: Session) -> List[dict]:
+    """
+    Execute calls from parse_tool_calls. Results keep call order.
+
+    Each call gets its "result" (the value, or {"error": ...} when it failed or
+    timed out) plus "ok", "elapsed_ms", "attempts", "timed_out" and "cached".
+    """
+    for batch in _batches(calls):
+        if len(batch) == 1:
+            _record(batch[0], execute_tool(batch[0]["tool"], batch[0]["args"]))
+            continue
+        futures = [_batch_executor.submit(execute_tool, call["tool"], call["args"]) for call in batch]
+        for call, future in zip(batch, futures):
+            _record(call, future.result())
+    return calls
+
+async def arun_tool_calls(calls: List[dict], db: AsyncSession) -> List[dict]:
+    """Async counterpart of run_tool_calls."""
+    for batch in _batches(calls):
+        results = await asyncio.gather(*(aexecute_tool(call["tool"], {**call["args"], "db": db}) for call in batch))
+        for call, result in zip(batch, results):
+            _record(call, result)
+    return calls
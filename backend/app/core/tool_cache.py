@@ -0,0 +1,112 @@
+import os
+import copy
+import json
+import threading
+from cachetools import TTLCache
+
+# Per-tool memoization: how long a result stays fresh, and which write tools
+# make it stale for the same user.
+TOOL_CACHE_POLICIES = {
+    "find_free_times": {"ttl": 60, "invalidated_by": {"create_event"}},
+    "get_upcoming_meetings": {"ttl": 120, "invalidated_by": {"create_event"}},
+    "find_contact": {"ttl": 300, "invalidated_by": {"create_contact", "add_note_to_hubspot"}},
+}
+TOOL_CACHE_ENABLED = os.getenv("TOOL_CACHE_ENABLED", "true").lower() == "true"
+TOOL_CACHE_SIZE = int(os.getenv("TOOL_CACHE_SIZE", "1024"))
+
+# Arguments that identify the caller rather than the query
+_IGNORED_ARGS = {"db", "user_id"}
+
+
+def _normalize(value):
+    if isinstance(value, str):
+        return value.strip().lower()
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in value.items()}
+    return value
+
+
+def cache_key(args: dict) -> tuple:
+    """(user_id, normalised arguments). Empty values count as omitted, so defaults share an entry."""
+    query = {
+        name: _normalize(value)
+        for name, value in args.items()
+        if name not in _IGNORED_ARGS and value not in (None, "", [], {})
+    }
+    return args.get("user_id"), json.dumps(query, sort_keys=True, default=str)
+
+
+class ToolCache:
+    """TTL caches for read-only tool results, one per tool, with write invalidation."""
+
+    def __init__(self, policies: dict, maxsize: int = TOOL_CACHE_SIZE):
+        self.policies = policies
+        self._caches = {name: TTLCache(maxsize=maxsize, ttl=policy["ttl"]) for name, policy in policies.items()}
+        self._invalidates = {}  # write tool -> cached tools it makes stale
+        for name, policy in policies.items():
+            for writer in policy["invalidated_by"]:
+                self._invalidates.setdefault(writer, set()).add(name)
+        self._lock = threading.Lock()
+        self._stats = {name: {"hits": 0, "misses": 0, "invalidations": 0} for name in policies}
+
+    def lookup(self, tool_name: str, args: dict) -> tuple[bool, object]:
+        """Return (found, result) for a cacheable tool."""
+        cache = self._caches.get(tool_name)
+        if cache is None or not TOOL_CACHE_ENABLED:
+            return False, None
+        key = cache_key(args)
+        with self._lock:
+            if key in cache:
+                self._stats[tool_name]["hits"] += 1
+                result = cache[key]
+            else:
+                self._stats[tool_name]["misses"] += 1
+                return False, None
+        # Callers may mutate what they get back
+        return True, copy.deepcopy(result)
+
+    def store(self, tool_name: str, args: dict, result):
+        """Remember a read-only result, or drop the user's entries a write tool made stale."""
+        if not TOOL_CACHE_ENABLED:
+            return
+        with self._lock:
+            if tool_name in self._caches:
+                self._caches[tool_name][cache_key(args)] = copy.deepcopy(result)
+            self._invalidate(tool_name, args)
+
+    def invalidate(self, tool_name: str, args: dict):
+        """Drop the user's entries a write tool may have made stale, without a result to store."""
+        if not TOOL_CACHE_ENABLED:
+            return
+        with self._lock:
+            self._invalidate(tool_name, args)
+
+    def _invalidate(self, tool_name: str, args: dict):
+        for name in self._invalidates.get(tool_name, ()):
+            cache = self._caches[name]
+            stale = [key for key in list(cache.keys()) if key[0] == args.get("user_id")]
+            for key in stale:
+                cache.pop(key, None)
+            self._stats[name]["invalidations"] += len(stale)
+
+    def clear(self):
+        with self._lock:
+            for cache in self._caches.values():
+                cache.clear()
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = {name: dict(counts, size=len(self._caches[name])) for name, counts in self._stats.items()}
+        for counts in stats.values():
+            lookups = counts["hits"] + counts["misses"]
+            counts["hit_rate"] = counts["hits"] / lookups if lookups else 0.0
+        return stats
+
+
+tool_cache = ToolCache(TOOL_CACHE_POLICIES)
+
+
+def get_tool_cache_stats() -> dict:
+    return tool_cache.get_stats()
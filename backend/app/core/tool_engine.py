@@ -0,0 +1,139 @@
+import os
+import time
+import random
+import asyncio
+import threading
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Callable
+
+# Per-integration limits: seconds to wait for one attempt, extra attempts for
+# read-only tools, and how many calls may hit the integration at once.
+# Override with e.g. GOOGLE_TOOL_TIMEOUT=10, HUBSPOT_TOOL_RETRIES=1, GOOGLE_TOOL_CONCURRENCY=4.
+INTEGRATION_POLICIES = {
+    "google": {"timeout": 20.0, "retries": 2, "concurrency": 8},
+    "hubspot": {"timeout": 15.0, "retries": 2, "concurrency": 4},
+    "internal": {"timeout": 5.0, "retries": 0, "concurrency": 16},
+}
+for _name, _policy in INTEGRATION_POLICIES.items():
+    _policy["timeout"] = float(os.getenv(f"{_name.upper()}_TOOL_TIMEOUT", _policy["timeout"]))
+    _policy["retries"] = int(os.getenv(f"{_name.upper()}_TOOL_RETRIES", _policy["retries"]))
+    _policy["concurrency"] = int(os.getenv(f"{_name.upper()}_TOOL_CONCURRENCY", _policy["concurrency"]))
+
+RETRY_BASE_DELAY = float(os.getenv("TOOL_RETRY_BASE_DELAY", "0.5"))
+
+# Errors caused by the call itself; retrying cannot fix them
+NON_RETRYABLE = (ValueError, TypeError)
+
+
+@dataclass
+class ToolResult:
+    tool: str
+    ok: bool
+    value: Any = None
+    error: str = None
+    attempts: int = 0
+    elapsed_ms: float = 0.0
+    timed_out: bool = False
+    cached: bool = False
+    # A write tool timed out: its thread may still finish, so it may have taken effect
+    outcome_unknown: bool = False
+
+    def payload(self):
+        """What the model sees: the value, or the error."""
+        if self.ok:
+            return self.value
+        if self.outcome_unknown:
+            return {"error": self.error, "outcome_unknown": True, "retry": False}
+        return {"error": self.error}
+
+
+def _backoff(attempt: int) -> float:
+    return RETRY_BASE_DELAY * (2 ** (attempt - 1)) * random.uniform(0.5, 1.5)
+
+
+class ToolEngine:
+    """
+    Runs tool calls under their integration's timeout, retry and concurrency policy.
+
+    Blocking tools run on the executor; the caller stops waiting at the timeout
+    (the worker thread finishes on its own and keeps its concurrency slot until
+    then). Only read-only calls are retried, with exponential backoff and jitter.
+    Failures are returned as ToolResult objects instead of raised.
+    """
+
+    def __init__(self, executor: ThreadPoolExecutor, policies: dict = INTEGRATION_POLICIES):
+        self.executor = executor
+        self.policies = policies
+        self._semaphores = {name: threading.BoundedSemaphore(p["concurrency"]) for name, p in policies.items()}
+        self._async_semaphores = {name: asyncio.Semaphore(p["concurrency"]) for name, p in policies.items()}
+
+    def _limited(self, integration: str, func: Callable):
+        with self._semaphores[integration]:
+            return func()
+
+    def _attempts(self, integration: str, retry: bool) -> int:
+        return 1 + (self.policies[integration]["retries"] if retry else 0)
+
+    def run(self, tool_name: str, func: Callable, integration: str = "internal", retry: bool = False) -> ToolResult:
+        """
+        Run a blocking tool and wait for it.
+
+        Args:
+            tool_name (str): Name reported in the result.
+            func (Callable): No-argument callable that performs the call.
+            integration (str): Key of INTEGRATION_POLICIES.
+            retry (bool): Retry failures; only for idempotent reads.
+        """
+        policy = self.policies[integration]
+        attempts = self._attempts(integration, retry)
+        result = ToolResult(tool=tool_name, ok=False)
+        start = time.perf_counter()
+        for attempt in range(1, attempts + 1):
+            result.attempts = attempt
+            future = self.executor.submit(self._limited, integration, func)
+            try:
+                value = future.result(timeout=policy["timeout"])
+                result.ok, result.value, result.error, result.timed_out = True, value, None, False
+                break
+            except FutureTimeoutError:
+                result.error, result.timed_out = f"`{tool_name}` timed out after {policy['timeout']:g}s", True
+            except NON_RETRYABLE as e:
+                result.error = str(e)
+                break
+            except Exception as e:
+                result.error = str(e)
+            if attempt < attempts:
+                time.sleep(_backoff(attempt))
+        result.elapsed_ms = (time.perf_counter() - start) * 1000
+        return result
+
+    async def arun(self, tool_name: str, func: Callable, integration: str = "internal", retry: bool = False,
+                   coroutine: bool = False) -> ToolResult:
+        """Async counterpart of run. With coroutine=True, func() returns an awaitable run on the loop."""
+        policy = self.policies[integration]
+        attempts = self._attempts(integration, retry)
+        result = ToolResult(tool=tool_name, ok=False)
+        start = time.perf_counter()
+        for attempt in range(1, attempts + 1):
+            result.attempts = attempt
+            try:
+                if coroutine:
+                    async with self._async_semaphores[integration]:
+                        value = await asyncio.wait_for(func(), timeout=policy["timeout"])
+                else:
+                    future = self.executor.submit(self._limited, integration, func)
+                    value = await asyncio.wait_for(asyncio.wrap_future(future), timeout=policy["timeout"])
+                result.ok, result.value, result.error, result.timed_out = True, value, None, False
+                break
+            except asyncio.TimeoutError:
+                result.error, result.timed_out = f"`{tool_name}` timed out after {policy['timeout']:g}s", True
+            except NON_RETRYABLE as e:
+                result.error = str(e)
+                break
+            except Exception as e:
+                result.error = str(e)
+            if attempt < attempts:
+                await asyncio.sleep(_backoff(attempt))
+        result.elapsed_ms = (time.perf_counter() - start) * 1000
+        return result
@@ -0,0 +1,117 @@
+import inspect
+from dataclasses import dataclass, field
+from typing import Any, Callable
+from pydantic import BaseModel, ConfigDict, Field, ValidationError, create_model
+
+# Supplied by the caller, never by the model
+INJECTED_ARGS = {"db", "user_id"}
+
+
+class ToolArgumentError(ValueError):
+    """Raised when a tool call names an unknown tool or has invalid arguments."""
+
+
+@dataclass
+class ToolSpec:
+    name: str
+    func: Callable
+    description: str
+    read_only: bool
+    integration: str
+    args_model: type[BaseModel]
+    schema: dict = field(default_factory=dict)
+
+
+TOOL_REGISTRY: dict[str, ToolSpec] = {}
+
+
+def _args_model(name: str, func: Callable, params: dict) -> type[BaseModel]:
+    """Pydantic model of the arguments the model may pass, built from the signature."""
+    fields = {}
+    accepts_extra = False
+    for param in inspect.signature(func).parameters.values():
+        if param.kind is inspect.Parameter.VAR_KEYWORD:
+            accepts_extra = True
+            continue
+        if param.name in INJECTED_ARGS or param.kind is inspect.Parameter.VAR_POSITIONAL:
+            continue
+        annotation = Any if param.annotation is inspect.Parameter.empty else param.annotation
+        default = ... if param.default is inspect.Parameter.empty else param.default
+        fields[param.name] = (annotation, Field(default, description=params.get(param.name)))
+    # Tools taking **kwargs tolerate extra arguments; the others reject them
+    config = ConfigDict(extra="ignore" if accepts_extra else "forbid")
+    return create_model(f"{name}_args", __config__=config, **fields)
+
+
+def _strip_titles(schema: dict) -> dict:
+    """Drop the titles pydantic adds to the model and its fields; property names are kept."""
+    schema = {key: value for key, value in schema.items() if key != "title"}
+    for key in ("properties", "$defs"):
+        if key in schema:
+            schema[key] = {name: _strip_titles(sub) for name, sub in schema[key].items()}
+    if isinstance(schema.get("items"), dict):
+        schema["items"] = _strip_titles(schema["items"])
+    for key in ("anyOf", "allOf", "oneOf"):
+        if key in schema:
+            schema[key] = [_strip_titles(sub) for sub in schema[key]]
+    return schema
+
+
+def tool(description: str, name: str = None, read_only: bool = False, params: dict = None,
+         integration: str = "internal"):
+    """
+    Register a function as a tool the chat model can call.
+
+    The JSON schema and argument validator are generated from the signature
+    once, at import. `db` and `user_id` are injected by the caller and left out.
+
+    Args:
+        description (str): What the tool does, shown to the model.
+        name (str): Tool name. Defaults to the function name.
+        read_only (bool): The tool has no side effects and may run concurrently.
+        params (dict): Optional descriptions of individual parameters.
+        integration (str): External service the tool calls; selects its timeout,
+            retry and concurrency policy in tool_engine.
+    """
+    def decorator(func):
+        tool_name = name or func.__name__
+        args_model = _args_model(tool_name, func, params or {})
+        TOOL_REGISTRY[tool_name] = ToolSpec(
+            name=tool_name,
+            func=func,
+            description=description,
+            read_only=read_only,
+            integration=integration,
+            args_model=args_model,
+            schema={
+                "name": tool_name,
+                "description": description,
+                "parameters": _strip_titles(args_model.model_json_schema()),
+            },
+        )
+        return func
+    return decorator
+
+
+def validate_args(tool_name: str, args: dict) -> dict:
+    """
+    Validate and coerce a tool call's arguments before it is dispatched.
+
+    Returns:
+        dict: The coerced arguments, without injected ones.
+
+    Raises:
+        ToolArgumentError: With a message meant to be sent back to the model.
+    """
+    spec = TOOL_REGISTRY.get(tool_name)
+    if spec is None:
+        raise ToolArgumentError(f"Unknown tool: {tool_name}")
+    try:
+        model = spec.args_model.model_validate({k: v for k, v in args.items() if k not in INJECTED_ARGS})
+    except ValidationError as e:
+        problems = "; ".join(
+            f"{'.'.join(str(part) for part in error['loc']) or 'arguments'}: {error['msg']}"
+            for error in e.errors()
+        )
+        raise ToolArgumentError(f"Invalid arguments for `{tool_name}`: {problems}")
+    return model.model_dump()
@@ -0,0 +1,112 @@
+import os
+import time
+from dataclasses import dataclass, asdict
+
+# Limits for one chat turn's tool loop. CHAT_MAX_ROUNDS counts model calls,
+# the last of which has no tools. Once the token budget or the deadline is
+# reached the model gets one last round without tools and must answer with
+# what it has.
+CHAT_MAX_ROUNDS = int(os.getenv("CHAT_MAX_ROUNDS", "6"))
+CHAT_TURN_TOKEN_BUDGET = int(os.getenv("CHAT_TURN_TOKEN_BUDGET", "60000"))
+CHAT_TURN_DEADLINE = float(os.getenv("CHAT_TURN_DEADLINE", "60"))
+
+# Least time a model request gets, so the final answer is not cut off
+# because the tool rounds used up the deadline
+MIN_ROUND_TIMEOUT = float(os.getenv("CHAT_MIN_ROUND_TIMEOUT", "15"))
+
+FINAL_ANSWER_NOTE = (
+    "The tool budget for this turn is used up. Answer the user now with the "
+    "information you already have, and say what is left undone."
+)
+
+
+@dataclass
+class RoundStats:
+    round: int
+    llm_ms: float = 0.0
+    tools_ms: float = 0.0
+    tool_calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+
+class TurnScheduler:
+    """
+    Enforces a chat turn's round, token and time budgets and times each round.
+
+    Usage per round: next_round() gives the extra arguments for the model
+    request, llm_done() records its usage, and tools_done() follows if the
+    model called tools. When a budget is exhausted, next_round() switches to a
+    final round with tool_choice="none" and a note asking for an answer.
+    """
+
+    def __init__(self, max_rounds: int = CHAT_MAX_ROUNDS, token_budget: int = CHAT_TURN_TOKEN_BUDGET,
+                 deadline: float = CHAT_TURN_DEADLINE):
+        self.max_rounds = max_rounds
+        self.token_budget = token_budget
+        self.deadline = deadline
+        self.started = time.perf_counter()
+        self.rounds: list[RoundStats] = []
+        self.tokens = 0
+        self.stop_reason = None
+        self._round_started = None
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    @property
+    def final(self) -> bool:
+        """The current round may not call tools."""
+        return self.stop_reason is not None
+
+    def _exhausted(self):
+        # The last allowed round is itself the final one, so max_rounds caps model calls
+        if len(self.rounds) + 1 >= self.max_rounds:
+            return "max_rounds"
+        if self.tokens >= self.token_budget:
+            return "token_budget"
+        if self.elapsed >= self.deadline:
+            return "deadline"
+        return None
+
+    def next_round(self, messages: list) -> dict:
+        """
+        Start a round and return the keyword arguments to add to the model request.
+
+        On the first round past a budget, FINAL_ANSWER_NOTE is appended to messages.
+        """
+        if not self.final:
+            self.stop_reason = self._exhausted()
+            if self.final:
+                print(f"Turn budget exhausted ({self.stop_reason}), asking for a final answer")
+                messages.append({"role": "system", "content": FINAL_ANSWER_NOTE})
+        self.rounds.append(RoundStats(round=len(self.rounds) + 1))
+        self._round_started = time.perf_counter()
+        options = {"timeout": max(self.deadline - self.elapsed, MIN_ROUND_TIMEOUT)}
+        if self.final:
+            options["tool_choice"] = "none"
+        return options
+
+    def llm_done(self, usage=None):
+        """Record the model request's time and token usage (a CompletionUsage, if reported)."""
+        stats = self.rounds[-1]
+        stats.llm_ms = round((time.perf_counter() - self._round_started) * 1000, 1)
+        if usage is not None:
+            stats.prompt_tokens = usage.prompt_tokens
+            stats.completion_tokens = usage.completion_tokens
+            self.tokens += usage.total_tokens
+        self._round_started = time.perf_counter()
+
+    def tools_done(self, calls: list):
+        stats = self.rounds[-1]
+        stats.tools_ms = round((time.perf_counter() - self._round_started) * 1000, 1)
+        stats.tool_calls = len(calls)
+
+    def get_stats(self) -> dict:
+        return {
+            "rounds": [asdict(stats) for stats in self.rounds],
+            "tokens": self.tokens,
+            "elapsed_ms": round(self.elapsed * 1000, 1),
+            "stop_reason": self.stop_reason,
+        }
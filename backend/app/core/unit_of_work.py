@@ -0,0 +1,51 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.tool_agent import READ_ONLY_TOOLS
+from app.models.task import Task
+
+
+def _has_side_effects(calls: list[dict]) -> bool:
+    return any(call["tool"] not in READ_ONLY_TOOLS for call in calls)
+
+
+class TurnUnitOfWork:
+    """
+    Buffers the rows a chat turn produces and writes them in one transaction per checkpoint.
+
+    A turn checkpoints around every tool round with side effects: before it, so
+    the conversation is on record before an email is sent or an event is
+    created, and after it, so the tool results are never left out of history
+    if the turn fails later. It checkpoints once more when the turn ends.
+    Read-only tool rounds write nothing.
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+        self.pending = []
+        self.checkpoints = 0
+
+    def add(self, *rows):
+        self.pending.extend(rows)
+
+    def add_task(self, user_id: int, type: str, task_metadata: dict = None, status: str = "pending") -> Task:
+        """Buffer a task like Task.create would; its id is set at the next checkpoint."""
+        task = Task(user_id=user_id, type=type, status=status, task_metadata=task_metadata or {})
+        self.pending.append(task)
+        return task
+
+    async def before_tools(self, calls: list[dict]):
+        if _has_side_effects(calls):
+            await self.checkpoint()
+
+    async def after_tools(self, calls: list[dict]):
+        """Write the results of a round with side effects right away, next to its assistant turn."""
+        if _has_side_effects(calls):
+            await self.checkpoint()
+
+    async def checkpoint(self):
+        """Insert everything buffered so far in a single transaction."""
+        if not self.pending:
+            return
+        self.db.add_all(self.pending)
+        self.pending = []
+        await self.db.commit()
+        self.checkpoints += 1
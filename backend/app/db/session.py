@@ -1,18 +1,44 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from pgvector.asyncpg import register_vector
 import os
 from dotenv import load_dotenv
+from app.db.vector import register_vector_search_defaults
 
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
+# Same database through asyncpg for the async request path
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or make_url(DATABASE_URL).set(drivername="postgresql+asyncpg")
 
 engine = create_engine(DATABASE_URL)
+register_vector_search_defaults(engine)
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
 
+# Connections are only held inside a transaction, not while a chat waits on OpenAI
+ASYNC_DB_POOL_SIZE = int(os.getenv("ASYNC_DB_POOL_SIZE", "20"))
+
+async_engine = create_async_engine(ASYNC_DATABASE_URL, pool_size=ASYNC_DB_POOL_SIZE, max_overflow=ASYNC_DB_POOL_SIZE)
+register_vector_search_defaults(async_engine.sync_engine)
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+
+@event.listens_for(async_engine.sync_engine, "connect")
+def _register_vector_codec(dbapi_connection, connection_record):
+    # asyncpg needs a codec to send and receive the vector type
+    dbapi_connection.run_async(register_vector)
+
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,46 @@
+import os
+from sqlalchemy import event
+from sqlalchemy.sql import text
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# HNSW candidate list size; higher means better recall and slower queries
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "100"))
+# pgvector >= 0.8 keeps scanning the index until enough rows pass the WHERE
+# clause (e.g. user_id), instead of returning fewer than LIMIT rows.
+# One of "off", "strict_order", "relaxed_order".
+HNSW_ITERATIVE_SCAN = os.getenv("HNSW_ITERATIVE_SCAN", "relaxed_order")
+if HNSW_ITERATIVE_SCAN not in ("off", "strict_order", "relaxed_order"):
+    raise ValueError(f"Invalid HNSW_ITERATIVE_SCAN: {HNSW_ITERATIVE_SCAN}")
+
+
+def register_vector_search_defaults(engine):
+    """Apply the default HNSW settings once per pooled connection instead of once per query."""
+    @event.listens_for(engine, "connect")
+    def _set_hnsw_defaults(dbapi_connection, connection_record):
+        # Validated constants are inlined so this works with any driver's paramstyle
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"SELECT set_config('hnsw.ef_search', '{HNSW_EF_SEARCH}', false)")
+        if HNSW_ITERATIVE_SCAN != "off":
+            cursor.execute(f"SELECT set_config('hnsw.iterative_scan', '{HNSW_ITERATIVE_SCAN}', false)")
+        cursor.close()
+        # Session-level settings made inside a rolled-back transaction are undone
+        dbapi_connection.commit()
+
+
+def set_vector_search_params(db, ef_search: int = None, limit: int = 0):
+    """
+    Override the HNSW search settings for the current transaction.
+
+    Args:
+        db: SQLAlchemy session; the settings end with its transaction.
+        ef_search (int): Override for hnsw.ef_search. Defaults to HNSW_EF_SEARCH.
+        limit (int): Largest LIMIT of the upcoming queries; ef_search is never set below it.
+    """
+    params = {"ef_search": str(max(ef_search or HNSW_EF_SEARCH, limit))}
+    sql = "SELECT set_config('hnsw.ef_search', :ef_search, true)"
+    if HNSW_ITERATIVE_SCAN != "off":
+        sql += ", set_config('hnsw.iterative_scan', :mode, true)"
+        params["mode"] = HNSW_ITERATIVE_SCAN
+    db.execute(text(sql), params)
@@ -6,5 +6,9 @@ from .contact_note import ContactNote
 from .task import Task
 from .instruction import Instruction
 from .chat_session import ChatSession, ChatMessage
+from .embedding_cache import EmbeddingCache
+from .document_chunk import DocumentChunk
+from .gmail_sync_state import GmailSyncState
+from .gmail_backfill import GmailBackfill
 from .base import Base
 from sqlalchemy.orm import declarative_base
\ No newline at end of file
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Text, JSON
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Text, JSON, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from .base import Base
@@ -9,6 +9,9 @@ class ChatSession(Base):
     user_id = Column(Integer, ForeignKey('users.id'))
     created_at = Column(DateTime, default=datetime.utcnow)
     # Optionally: topic/title
+    # Rolling summary of every message up to and including summary_message_id
+    summary = Column(Text, nullable=True)
+    summary_message_id = Column(Integer, nullable=True)
 
     messages = relationship("ChatMessage", back_populates="session")
 
@@ -16,9 +19,28 @@ class ChatMessage(Base):
     __tablename__ = "chat_messages"
     id = Column(Integer, primary_key=True)
     session_id = Column(Integer, ForeignKey('chat_sessions.id'))
-    role = Column(String)  # "user", "assistant", or "function"
+    role = Column(String)  # "user", "assistant", "system" (retrieved context), "tool", or legacy "function"
     name = Column(String, nullable=True)  # for functions, tool name
     content = Column(Text)  # message content or serialized result
+    tool_calls = Column(JSON, nullable=True)  # assistant turns: the tool calls it requested
+    tool_call_id = Column(String, nullable=True)  # tool results: the call they answer
+    documents = Column(JSON, nullable=True)  # context messages: keys of the documents injected
     created_at = Column(DateTime, default=datetime.utcnow)
 
-    session = relationship("ChatSession", back_populates="messages")
\ No newline at end of file
+    session = relationship("ChatSession", back_populates="messages")
+
+    # The history window reads the newest messages of one session
+    __table_args__ = (
+        Index('ix_chat_messages_session_id', 'session_id', 'id'),
+    )
+
+    @staticmethod
+    def to_message(row) -> dict:
+        """A ChatMessage, or a row with the same columns, in the chat completions message format."""
+        if row.role == "function":
+            return {"role": "function", "name": row.name, "content": row.content}
+        if row.role == "tool":
+            return {"role": "tool", "tool_call_id": row.tool_call_id, "content": row.content}
+        if row.tool_calls:
+            return {"role": "assistant", "content": row.content, "tool_calls": row.tool_calls}
+        return {"role": row.role, "content": row.content}
\ No newline at end of file
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, Text, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, Text, ForeignKey, DateTime, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from .base import Base
@@ -10,7 +10,7 @@ class ContactNote(Base):
 
     id = Column(Integer, primary_key=True)
     contact_id = Column(Integer, ForeignKey('contacts.id'))
-    user_id = Column(Integer, ForeignKey('users.id'))
+    user_id = Column(Integer, ForeignKey('users.id'), index=True)
     content = Column(Text)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -19,6 +19,16 @@ class ContactNote(Base):
 
     contact = relationship("Contact", back_populates="contact_notes")
     user = relationship("User")
+    chunks = relationship("DocumentChunk", back_populates="contact_note", cascade="all, delete-orphan", passive_deletes=True)
+
+    __table_args__ = (
+        Index(
+            'ix_contact_notes_embedding_hnsw', 'embedding',
+            postgresql_using='hnsw',
+            postgresql_with={'m': 16, 'ef_construction': 64},
+            postgresql_ops={'embedding': 'vector_ip_ops'},
+        ),
+    )
     
     
     @classmethod
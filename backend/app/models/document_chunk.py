@@ -0,0 +1,59 @@
+from sqlalchemy import Column, Integer, Text, ForeignKey, DateTime, Index, Computed
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import relationship
+from datetime import datetime
+from .base import Base
+from sqlalchemy.orm import Session
+from pgvector.sqlalchemy import Vector
+
+class DocumentChunk(Base):
+    __tablename__ = 'document_chunks'
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id'), index=True)
+    # Exactly one of the parent references is set
+    email_id = Column(Integer, ForeignKey('emails.id', ondelete='CASCADE'), nullable=True, index=True)
+    contact_note_id = Column(Integer, ForeignKey('contact_notes.id', ondelete='CASCADE'), nullable=True, index=True)
+    chunk_index = Column(Integer, nullable=False)
+    # Token window of the parent document covered by this chunk
+    token_start = Column(Integer, nullable=False)
+    token_end = Column(Integer, nullable=False)
+    content = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    embedding = Column(Vector(1536))
+    search_vector = Column(TSVECTOR, Computed("to_tsvector('english', coalesce(content, ''))", persisted=True))
+
+    email = relationship("Email", back_populates="chunks")
+    contact_note = relationship("ContactNote", back_populates="chunks")
+
+    __table_args__ = (
+        Index(
+            'ix_document_chunks_embedding_hnsw', 'embedding',
+            postgresql_using='hnsw',
+            postgresql_with={'m': 16, 'ef_construction': 64},
+            postgresql_ops={'embedding': 'vector_ip_ops'},
+        ),
+        Index('ix_document_chunks_search_vector', 'search_vector', postgresql_using='gin'),
+    )
+
+
+    @classmethod
+    def create_many(cls, db: Session, user_id: int, chunks: list[dict], email_id: int = None,
+                    contact_note_id: int = None) -> list["DocumentChunk"]:
+        rows = [
+            cls(
+                user_id=user_id,
+                email_id=email_id,
+                contact_note_id=contact_note_id,
+                chunk_index=chunk["chunk_index"],
+                token_start=chunk["token_start"],
+                token_end=chunk["token_end"],
+                content=chunk["content"],
+                embedding=chunk["embedding"],
+            )
+            for chunk in chunks
+        ]
+        db.add_all(rows)
+        db.commit()
+        return rows
@@ -1,38 +1,59 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Index, Computed, or_, exists, func
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.orm import relationship
 from .base import Base
 from datetime import datetime
 from sqlalchemy.orm import Session
 from pgvector.sqlalchemy import Vector
+from .document_chunk import DocumentChunk
 
 class Email(Base):
     __tablename__ = 'emails'
 
     id = Column(Integer, primary_key=True)
-    user_id = Column(Integer, ForeignKey('users.id'))
+    user_id = Column(Integer, ForeignKey('users.id'), index=True)
     sender = Column(String)
     recipient = Column(String)
     subject = Column(String)
-    body = Column(Text)
+    body = Column(Text)  # raw base64url `data` of the text/plain part, as returned by Gmail
+    body_text = Column(Text)  # decoded, charset-normalised plain text
     message_id = Column(String, unique=True)
     received_at = Column(DateTime)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     embedding = Column(Vector(1536))
+    # Header text for full-text search; the decoded body is indexed per chunk
+    search_vector = Column(TSVECTOR, Computed(
+        "to_tsvector('english', coalesce(subject, '') || ' ' || coalesce(sender, '') || ' ' || coalesce(recipient, ''))",
+        persisted=True,
+    ))
 
     user = relationship("User", back_populates="emails")
+    chunks = relationship("DocumentChunk", back_populates="email", cascade="all, delete-orphan", passive_deletes=True)
+
+    __table_args__ = (
+        # Approximate nearest-neighbour index for `embedding <#> :query` (inner product)
+        Index(
+            'ix_emails_embedding_hnsw', 'embedding',
+            postgresql_using='hnsw',
+            postgresql_with={'m': 16, 'ef_construction': 64},
+            postgresql_ops={'embedding': 'vector_ip_ops'},
+        ),
+        Index('ix_emails_search_vector', 'search_vector', postgresql_using='gin'),
+    )
     
     
     @classmethod
     def create(cls, db: Session, user_id: int, sender: str, recipient: str, subject: str, body: str,
-               message_id: str, received_at: datetime, embedding: Vector) -> "Email":
+               message_id: str, received_at: datetime, embedding: Vector, body_text: str = None) -> "Email":
         email = cls(
             user_id=user_id,
             sender=sender,
             recipient=recipient,
             subject=subject,
             body=body,
+            body_text=body_text,
             message_id=message_id,
             received_at=received_at,
             embedding=embedding  # Assuming embedding will be set later
@@ -58,9 +79,15 @@ class Email(Base):
 
     @classmethod
     def search_by_keyword(cls, db: Session, user_id: int, keyword: str, limit: int = 10) -> list["Email"]:
+        # Full-text match on the headers or on any decoded body chunk, both GIN-indexed
+        query = func.websearch_to_tsquery("english", keyword)
+        body_match = exists().where(
+            DocumentChunk.email_id == cls.id,
+            DocumentChunk.search_vector.op("@@")(query),
+        )
         return (
             db.query(cls)
-            .filter(cls.user_id == user_id, cls.body.ilike(f"%{keyword}%"))
+            .filter(cls.user_id == user_id, or_(cls.search_vector.op("@@")(query), body_match))
             .order_by(cls.received_at.desc())
             .limit(limit)
             .all()
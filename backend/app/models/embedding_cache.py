@@ -0,0 +1,13 @@
+from sqlalchemy import Column, String, DateTime
+from datetime import datetime
+from .base import Base
+from pgvector.sqlalchemy import Vector
+
+class EmbeddingCache(Base):
+    __tablename__ = 'embedding_cache'
+
+    # sha256 of (model, truncated input text)
+    content_hash = Column(String(64), primary_key=True)
+    model = Column(String, nullable=False)
+    embedding = Column(Vector(1536), nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
@@ -0,0 +1,61 @@
+from sqlalchemy import Column, Integer, String, Text, Date, DateTime, Float, ForeignKey
+from datetime import datetime
+from .base import Base
+from sqlalchemy.orm import Session
+
+class GmailBackfill(Base):
+    __tablename__ = 'gmail_backfills'
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), index=True)
+    status = Column(String, default="pending")  # pending, running, completed, failed
+    # Optional date window; Gmail's after:/before: search operators
+    after = Column(Date)
+    before = Column(Date)
+    # Checkpoint: the next page to list, and totals so far
+    page_token = Column(String)
+    pages = Column(Integer, default=0)
+    messages_seen = Column(Integer, default=0)
+    messages_stored = Column(Integer, default=0)
+    elapsed_seconds = Column(Float, default=0.0)  # summed over every run
+    error = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    finished_at = Column(DateTime)
+
+
+    @classmethod
+    def get_unfinished(cls, db: Session, user_id: int = None) -> list["GmailBackfill"]:
+        query = db.query(cls).filter(cls.status.in_(["pending", "running"]))
+        if user_id is not None:
+            query = query.filter(cls.user_id == user_id)
+        return query.order_by(cls.id).all()
+
+    @classmethod
+    def get_failed(cls, db: Session, user_id: int, after=None, before=None) -> "GmailBackfill | None":
+        """The user's latest failed backfill over exactly this date window."""
+        return (
+            db.query(cls)
+            .filter(cls.user_id == user_id, cls.status == "failed", cls.after == after, cls.before == before)
+            .order_by(cls.id.desc())
+            .first()
+        )
+
+    @property
+    def messages_per_second(self) -> float:
+        return self.messages_seen / self.elapsed_seconds if self.elapsed_seconds else 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "user_id": self.user_id,
+            "status": self.status,
+            "after": self.after,
+            "before": self.before,
+            "pages": self.pages,
+            "messages_seen": self.messages_seen,
+            "messages_stored": self.messages_stored,
+            "messages_per_second": round(self.messages_per_second, 2),
+            "error": self.error,
+            "finished_at": self.finished_at,
+        }
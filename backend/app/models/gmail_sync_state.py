@@ -0,0 +1,29 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from datetime import datetime
+from .base import Base
+from sqlalchemy.orm import Session
+
+class GmailSyncState(Base):
+    __tablename__ = 'gmail_sync_states'
+
+    user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    # Mailbox historyId the stored emails are current up to; incremental syncs start here
+    history_id = Column(String)
+    synced_at = Column(DateTime)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+    @classmethod
+    def get_or_create(cls, db: Session, user_id: int) -> "GmailSyncState":
+        state = db.get(cls, user_id)
+        if state is None:
+            state = cls(user_id=user_id)
+            db.add(state)
+            db.commit()
+        return state
+
+    def mark_synced(self, db: Session, history_id: str):
+        self.history_id = history_id
+        self.synced_at = datetime.utcnow()
+        db.commit()
@@ -57,8 +57,8 @@ class Task(Base):
     user = relationship("User", back_populates="tasks")
 
     @classmethod
-    def create(cls, db, user_id, type, task_metadata=None, external_reference=None):
-        task = cls(user_id=user_id, type=type, status="pending",
+    def create(cls, db, user_id, type, task_metadata=None, external_reference=None, status="pending"):
+        task = cls(user_id=user_id, type=type, status=status,
                    task_metadata=task_metadata or {}, external_reference=external_reference)
         db.add(task)
         db.commit()
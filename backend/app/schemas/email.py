@@ -0,0 +1,10 @@
+from pydantic import BaseModel
+from typing import Optional
+from datetime import date
+
+
+class BackfillInput(BaseModel):
+    user_id: int
+    # Optional date window; the whole mailbox when both are empty
+    after: Optional[date] = None
+    before: Optional[date] = None
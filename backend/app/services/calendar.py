@@ -1,17 +1,21 @@
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
 from sqlalchemy.orm import Session
 from app.models.user import User
 from typing import List
 from datetime import datetime, timedelta
 import pytz
+from app.core.tool_registry import tool
+from app.services.google_client import google_service
 
-import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
 
+@tool("Create a Google Calendar event", integration="google", params={
+    "start_time": "ISO 8601 start time",
+    "end_time": "ISO 8601 end time",
+    "attendees": "List of email addresses",
+})
 def create_event(
     user_id: int,
     title: str,
@@ -25,19 +29,7 @@ def create_event(
     if not user or not user.google_access_token:
         raise Exception("Google account not connected.")
 
-    # Step 2: Set up Google credentials
-    creds = Credentials(
-        token=user.google_access_token,
-        refresh_token=user.google_refresh_token,
-        token_uri="https://oauth2.googleapis.com/token",
-        client_id=os.getenv("GOOGLE_CLIENT_ID"),
-        client_secret=os.getenv("GOOGLE_CLIENT_SECRET"),
-    )
-
-    # Step 3: Build Google Calendar client
-    service = build("calendar", "v3", credentials=creds)
-
-    # Step 4: Build event body
+    # Step 2: Build event body
     event = {
         "summary": title,
         "start": {"dateTime": start_time, "timeZone": "UTC"},
@@ -46,12 +38,16 @@ def create_event(
     }
 
     try:
-        created_event = service.events().insert(calendarId="primary", body=event, sendUpdates="all").execute()
+        with google_service(user, "calendar", "v3") as service:
+            created_event = service.events().insert(calendarId="primary", body=event, sendUpdates="all").execute()
         return f"Event '{title}' created with ID: {created_event['id']}"
     except Exception as e:
         raise Exception(f"Failed to create event: {e}")
 
 
+@tool("Finds available times for a meeting.", read_only=True, integration="google", params={
+    "date_range": '"today", "next week" or a date such as "2024-06-25"',
+})
 def find_free_times(
     user_id: int,
     date_range: str = "today",
@@ -73,15 +69,6 @@ def find_free_times(
     if not user or not user.google_access_token:
         raise Exception("Google account not connected.")
 
-    creds = Credentials(
-        token=user.google_access_token,
-        refresh_token=user.google_refresh_token,
-        token_uri="https://oauth2.googleapis.com/token",
-        client_id=os.getenv("GOOGLE_CLIENT_ID"),
-        client_secret=os.getenv("GOOGLE_CLIENT_SECRET"),
-    )
-    service = build("calendar", "v3", credentials=creds)
-
     # Date range calculation
     tz = pytz.UTC
     now = datetime.now(tz)
@@ -105,7 +92,8 @@ def find_free_times(
         "timeZone": "UTC",
         "items": [{"id": "primary"}],
     }
-    freebusy = service.freebusy().query(body=body).execute()
+    with google_service(user, "calendar", "v3") as service:
+        freebusy = service.freebusy().query(body=body).execute()
     busy_times = freebusy['calendars']['primary']['busy']
 
     # Calculate free slots (simple version: 1-hour slots, not in busy)
@@ -123,6 +111,7 @@ def find_free_times(
     return slots
 
 
+@tool("Gets upcoming meetings for a contact.", read_only=True, integration="google")
 def get_upcoming_meetings(
     user_id: int,
     contact_email: str,
@@ -144,19 +133,11 @@ def get_upcoming_meetings(
     if not user or not user.google_access_token:
         raise Exception("Google account not connected.")
 
-    creds = Credentials(
-        token=user.google_access_token,
-        refresh_token=user.google_refresh_token,
-        token_uri="https://oauth2.googleapis.com/token",
-        client_id=os.getenv("GOOGLE_CLIENT_ID"),
-        client_secret=os.getenv("GOOGLE_CLIENT_SECRET"),
-    )
-    service = build("calendar", "v3", credentials=creds)
-
     now = datetime.utcnow().isoformat() + 'Z'
-    events_result = service.events().list(
-        calendarId='primary', timeMin=now, maxResults=20, singleEvents=True, orderBy='startTime'
-    ).execute()
+    with google_service(user, "calendar", "v3") as service:
+        events_result = service.events().list(
+            calendarId='primary', timeMin=now, maxResults=20, singleEvents=True, orderBy='startTime'
+        ).execute()
     events = events_result.get('items', [])
 
     meetings = []
@@ -0,0 +1,120 @@
+import os
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from app.models.document_chunk import DocumentChunk
+from app.services.embedding import EMBEDDING_MODEL, generate_embeddings
+from app.utils.tokens import get_encoding
+
+# Window size and overlap (in tokens) used to split emails and notes
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", "512"))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "64"))
+# Documents read and embedded per round by index_unchunked
+INDEX_UNCHUNKED_BATCH = int(os.getenv("INDEX_UNCHUNKED_BATCH", "64"))
+
+
+def chunk_text(text: str, chunk_tokens: int = CHUNK_TOKENS, overlap: int = CHUNK_OVERLAP) -> list[dict]:
+    """
+    Split text into overlapping token windows.
+
+    Returns:
+        list[dict]: Chunks with chunk_index, token_start, token_end and content.
+    """
+    enc = get_encoding(EMBEDDING_MODEL)
+    tokens = enc.encode(text or "")
+    step = max(chunk_tokens - overlap, 1)
+
+    chunks = []
+    start = 0
+    while start < len(tokens):
+        end = min(start + chunk_tokens, len(tokens))
+        chunks.append({
+            "chunk_index": len(chunks),
+            "token_start": start,
+            "token_end": end,
+            "content": enc.decode(tokens[start:end]),
+        })
+        if end == len(tokens):
+            break
+        start += step
+    return chunks
+
+
+def pool_embeddings(vectors: list[list[float]]) -> list[float]:
+    """Mean of the chunk vectors, re-normalised to unit length like the model's own output."""
+    mean = np.mean(np.asarray(vectors, dtype=np.float32), axis=0)
+    norm = np.linalg.norm(mean)
+    return (mean / norm if norm else mean).tolist()
+
+
+def embed_documents(texts: list[str]) -> tuple[list, list[list[dict]]]:
+    """
+    Chunk documents and embed every chunk with a single batched call.
+
+    Returns:
+        tuple: Document-level embeddings (pooled over chunks, None for empty documents)
+        and each document's chunks with an "embedding" key set.
+    """
+    chunked = [chunk_text(text) for text in texts]
+    flat = [chunk for chunks in chunked for chunk in chunks]
+    for chunk, vector in zip(flat, generate_embeddings([c["content"] for c in flat])):
+        chunk["embedding"] = vector
+
+    doc_embeddings = [
+        pool_embeddings([c["embedding"] for c in chunks]) if chunks else None
+        for chunks in chunked
+    ]
+    return doc_embeddings, chunked
+
+
+def stitch_chunks(chunks: list[dict]) -> str:
+    """Join retrieved chunks of one document in order, dropping overlapping tokens and marking gaps."""
+    enc = get_encoding(EMBEDDING_MODEL)
+    parts = []
+    covered_until = None
+    for chunk in sorted(chunks, key=lambda c: c["token_start"]):
+        content = chunk["content"]
+        if covered_until is not None:
+            if chunk["token_end"] <= covered_until:
+                continue
+            if chunk["token_start"] < covered_until:
+                content = enc.decode(enc.encode(content)[covered_until - chunk["token_start"]:])
+            else:
+                parts.append("\n[...]\n")
+        parts.append(content)
+        covered_until = chunk["token_end"]
+    return "".join(parts)
+
+
+def index_unchunked(db: Session, user_id: int, model, text_column, parent_field: str) -> int:
+    """
+    Chunk and embed a user's documents that have no chunks yet.
+
+    Only ids and text are read, INDEX_UNCHUNKED_BATCH rows at a time, and rows
+    without text are skipped, so documents that can never be chunked are not
+    loaded again on every sync.
+
+    Args:
+        model: Email or ContactNote.
+        text_column: Column with the document text, e.g. Email.body_text.
+        parent_field (str): DocumentChunk's reference to model, e.g. "email_id".
+
+    Returns:
+        int: How many documents were chunked.
+    """
+    indexed, last_id = 0, 0
+    while True:
+        rows = db.execute(
+            select(model.id, text_column)
+            .where(model.user_id == user_id, model.id > last_id, ~model.chunks.any(), func.trim(text_column) != "")
+            .order_by(model.id)
+            .limit(INDEX_UNCHUNKED_BATCH)
+        ).all()
+        if not rows:
+            return indexed
+        last_id = rows[-1].id
+        _, chunked = embed_documents([text for _, text in rows])
+        for (parent_id, _), chunks in zip(rows, chunked):
+            if chunks:
+                DocumentChunk.create_many(db, user_id=user_id, chunks=chunks, **{parent_field: parent_id})
+                indexed += 1
@@ -1,54 +1,78 @@
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
 import base64
+from googleapiclient.errors import HttpError
+import re
+import unicodedata
+from bs4 import BeautifulSoup
+from charset_normalizer import from_bytes
 from email.mime.text import MIMEText
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm import Session
 from app.models.user import User
 import os
+import time
+import threading
 from dotenv import load_dotenv
 from app.models.email import Email
-from app.services.embedding import generate_embedding
-from google.oauth2.credentials import Credentials
+from app.models.document_chunk import DocumentChunk
+from app.services.chunking import index_unchunked
+from app.services.vector_index import queue_inserted_chunks
+from app.core.tool_registry import tool
+from typing import List
+from app.services.google_client import google_service
 from datetime import datetime
 
 load_dotenv()
 
+# Sub-requests per Gmail batch HTTP request (the API allows up to 100)
+GMAIL_BATCH_SIZE = int(os.getenv("GMAIL_BATCH_SIZE", "100"))
 
+# Gmail allows 250 quota units per user per second; stay below it so the
+# regular sync and the tools keep working while a backfill runs
+GMAIL_QUOTA_UNITS_PER_SECOND = float(os.getenv("GMAIL_QUOTA_UNITS_PER_SECOND", "150"))
+GMAIL_RATE_LIMIT_RETRIES = int(os.getenv("GMAIL_RATE_LIMIT_RETRIES", "5"))
+
+# Quota units per call
+LIST_COST = 5
+GET_COST = 5
+
+# Which mail is synced: listing uses the labels and query, incremental syncs
+# check the labels of each added message
+SYNC_LABELS = {"INBOX", "IMPORTANT"}
+SYNC_QUERY = "-category:promotions -category:social -in:spam -in:trash"
+EXCLUDED_LABELS = {"CATEGORY_PROMOTIONS", "CATEGORY_SOCIAL", "SPAM", "TRASH"}
+
+
+@tool("Send an email via Gmail", integration="google", params={
+    "to": "Email address of the recipient",
+    "subject": "Subject of the email",
+    "body": "Body of the email",
+})
 def send_email(to: str, subject: str, body: str, db: Session = None, user_id: int = None) -> str:
     # 1. Get user's token from database
     user = db.query(User).filter_by(id=user_id).first()
     if not user or not user.google_access_token:
         raise Exception("User not authenticated with Google")
 
-    # 2. Create Google Credentials
-    creds = Credentials(
-        token=user.google_access_token,
-        refresh_token=user.google_refresh_token,
-        token_uri="https://oauth2.googleapis.com/token",
-        client_id=os.getenv('GOOGLE_CLIENT_ID'),
-        client_secret=os.getenv('GOOGLE_CLIENT_SECRET'),
-    )
-
-    # 3. Build Gmail API client
-    service = build("gmail", "v1", credentials=creds)
-
-    # 4. Create email message
+    # 2. Create email message
     message = MIMEText(body)
     message["to"] = to
     message["subject"] = subject
     raw_message = {"raw": base64.urlsafe_b64encode(message.as_bytes()).decode()}
 
-    # 5. Send email
+    # 3. Send email with the user's pooled Gmail client
     try:
-        response = service.users().messages().send(userId="me", body=raw_message).execute()
+        with google_service(user, "gmail", "v1") as service:
+            response = service.users().messages().send(userId="me", body=raw_message).execute()
         return f"Email sent to {to} with ID: {response['id']}"
     except Exception as e:
         raise Exception(f"Failed to send email: {e}")
 
 
+@tool("Send an email with available meeting times.", integration="google")
 def propose_times_email(
     to: str,
-    available_times: list,
+    available_times: List[str],
     body: str = "",
     db: Session = None,
     user_id: int = None,
@@ -93,68 +117,270 @@ def propose_times_email(
     )
 
 
-def build_gmail_service(access_token: str):
-    return build("gmail", "v1", credentials={"token": access_token})
+def list_recent_messages(service, max_results=100):
+    messages, _ = list_messages_page(service, max_results=max_results)
+    return messages
 
 
-def list_recent_messages(service, max_results=100):
+def list_messages_page(service, page_token: str = None, query: str = SYNC_QUERY, max_results: int = 100):
+    """One page of synced messages, newest first. Returns (messages, next page token or None)."""
     results = service.users().messages().list(
         userId="me",
-        labelIds=["INBOX", "IMPORTANT"],
+        labelIds=sorted(SYNC_LABELS),
         maxResults=max_results,
-        q="-category:promotions -category:social -in:spam -in:trash"
+        q=query,
+        pageToken=page_token
     ).execute()
-    return results.get("messages", [])
+    return results.get("messages", []), results.get("nextPageToken")
+
 
+def extract_message_body(msg: dict):
+    """
+    Return the body of a message fetched with format="full".
 
-def extract_message_body(service, msg_id):
-    msg = service.users().messages().get(userId="me", id=msg_id, format="full").execute()
-    parts = msg["payload"].get("parts", [])
-    for part in parts:
+    Returns:
+        tuple: Raw base64url `data` of the top-level text/plain part (kept in `Email.body`)
+        and the decoded plain text of the whole message.
+    """
+    payload = msg.get("payload", {})
+    raw = ""
+    for part in payload.get("parts", []):
         if part.get("mimeType") == "text/plain":
-            return part["body"].get("data", "")
+            raw = part["body"].get("data", "")
+            break
+    return raw, extract_message_text(payload)
+
+
+class QuotaThrottle:
+    """
+    Token bucket over Gmail quota units; spend() sleeps until the units are available.
+
+    Thread-safe, so concurrent fetch workers can share one bucket.
+    """
+
+    def __init__(self, units_per_second: float = GMAIL_QUOTA_UNITS_PER_SECOND):
+        self.rate = units_per_second
+        self.allowance = units_per_second
+        self.last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def spend(self, units: float):
+        with self._lock:
+            now = time.monotonic()
+            self.allowance = min(self.rate, self.allowance + (now - self.last) * self.rate)
+            self.last = now
+            self.allowance -= units
+            # A negative allowance is debt the next callers wait out, so
+            # concurrent spenders queue up instead of all sleeping the same time
+            wait = -self.allowance / self.rate if self.allowance < 0 else 0
+        if wait:
+            time.sleep(wait)
+
+
+def get_messages(service, msg_ids: List[str]) -> tuple[dict, list]:
+    """
+    Fetch messages with format="full", GMAIL_BATCH_SIZE per batch HTTP request.
+
+    Returns:
+        tuple[dict, list]: Message resources by id, and the ids that failed to
+        load. Messages deleted since they were listed (404) are in neither.
+    """
+    messages = {}
+    failed = []
+
+    def on_response(request_id, response, exception):
+        if exception is None:
+            messages[request_id] = response
+        elif isinstance(exception, HttpError) and exception.resp.status == 404:
+            print(f"Message {request_id} no longer exists, skipping")
+        else:
+            print(f"Failed to fetch message {request_id}: {exception}")
+            failed.append(request_id)
+
+    for start in range(0, len(msg_ids), GMAIL_BATCH_SIZE):
+        batch = service.new_batch_http_request(callback=on_response)
+        for msg_id in msg_ids[start:start + GMAIL_BATCH_SIZE]:
+            batch.add(service.users().messages().get(userId="me", id=msg_id, format="full"), request_id=msg_id)
+        batch.execute()
+    return messages, failed
+
+
+def parse_message(msg: dict) -> dict | None:
+    """Email fields of a full message resource, or None if it has no text."""
+    headers = msg.get("payload", {}).get("headers", [])
+
+    def extract_header(name):
+        return next((h["value"] for h in headers if h["name"].lower() == name.lower()), None)
+
+    content, text = extract_message_body(msg)
+    if not text:
+        return None
+    timestamp = int(msg.get("internalDate", 0)) // 1000  # convert ms to seconds
+    return {
+        "sender": extract_header("From"),
+        "recipient": extract_header("To"),
+        "subject": extract_header("Subject"),
+        "body": content,
+        "body_text": text,
+        "message_id": msg["id"],
+        "received_at": datetime.fromtimestamp(timestamp),
+    }
+
+
+def _part_charset(part: dict) -> str | None:
+    for header in part.get("headers", []):
+        if header["name"].lower() == "content-type":
+            match = re.search(r'charset="?([^";\s]+)', header["value"], re.IGNORECASE)
+            if match:
+                return match.group(1)
+    return None
+
+
+def decode_bytes(raw: bytes, charset: str = None) -> str:
+    """Decode with the declared charset, then UTF-8, then a detected charset."""
+    if charset:
+        try:
+            return raw.decode(charset)
+        except (LookupError, UnicodeDecodeError):
+            pass
+    try:
+        return raw.decode("utf-8")
+    except UnicodeDecodeError:
+        best = from_bytes(raw).best()
+        return str(best) if best else raw.decode("utf-8", errors="replace")
+
+
+def normalize_text(text: str) -> str:
+    text = unicodedata.normalize("NFC", text).replace("\r\n", "\n").replace("\r", "\n")
+    text = re.sub(r"[ \t]+\n", "\n", text)
+    text = re.sub(r"\n{3,}", "\n\n", text)
+    return text.strip()
+
+
+def decode_message_data(data: str, charset: str = None) -> str:
+    """Decode a Gmail base64url body `data` field to text."""
+    if not data:
+        return ""
+    padded = data + "=" * (-len(data) % 4)
+    return decode_bytes(base64.urlsafe_b64decode(padded), charset)
+
+
+def extract_message_text(payload: dict) -> str:
+    """Plain text of a Gmail message payload: text/plain parts first, stripped HTML otherwise."""
+    plain, html = [], []
+
+    def walk(part):
+        mime_type = part.get("mimeType", "")
+        if mime_type.startswith("multipart/"):
+            for child in part.get("parts", []):
+                walk(child)
+            return
+        if part.get("filename"):
+            return  # attachment
+        data = part.get("body", {}).get("data")
+        if mime_type == "text/plain" and data:
+            plain.append(decode_message_data(data, _part_charset(part)))
+        elif mime_type == "text/html" and data:
+            html.append(decode_message_data(data, _part_charset(part)))
+
+    walk(payload)
+    if plain:
+        return normalize_text("\n\n".join(plain))
+    if html:
+        return normalize_text(BeautifulSoup("\n".join(html), "html.parser").get_text("\n"))
     return ""
 
 
-def sync_gmail_emails(user, db):
-    creds = Credentials(token=user.google_access_token)
-    service = build("gmail", "v1", credentials=creds)
-    messages = list_recent_messages(service)
-
-    for m in messages:
-        # Check if this message_id already exists for this user
-        existing = db.query(Email).filter_by(user_id=user.id, message_id=m["id"]).first()
-        if existing:
-            continue  # Skip if already in database
-        
-        # Get full metadata
-        metadata = service.users().messages().get(userId="me", id=m["id"], format="metadata").execute()
-        headers = metadata.get("payload", {}).get("headers", [])
-
-        def extract_header(name):
-            return next((h["value"] for h in headers if h["name"].lower() == name.lower()), None)
-
-        sender = extract_header("From")
-        recipient = extract_header("To")
-        subject = extract_header("Subject")
-        timestamp = int(metadata.get("internalDate", 0)) // 1000  # convert ms to seconds
-        received_at = datetime.fromtimestamp(timestamp)
-
-        content = extract_message_body(service, m["id"])
-        if not content:
-            continue
-
-        embedding = generate_embedding(content)
-
-        # Use your class method
-        Email.create(
-            db=db,
-            user_id=user.id,
-            sender=sender,
-            recipient=recipient,
-            subject=subject,
-            body=content,
-            message_id=m["id"],
-            received_at=received_at,
-            embedding=embedding
-        )
\ No newline at end of file
+def index_unchunked_emails(user, db):
+    """Chunk and embed emails that were stored before chunked embeddings existed."""
+    return index_unchunked(db, user.id, Email, Email.body_text, "email_id")
+
+
+def list_history_message_ids(service, start_history_id: str) -> tuple[list, str] | None:
+    """
+    Ids of messages added since start_history_id that match the sync filter.
+
+    Returns:
+        tuple: The message ids, oldest first, and the mailbox's current historyId;
+        or None when start_history_id is too old and a full sync is needed.
+    """
+    ids, page_token = [], None
+    try:
+        while True:
+            response = service.users().history().list(
+                userId="me",
+                startHistoryId=start_history_id,
+                historyTypes=["messageAdded"],
+                labelId="INBOX",
+                pageToken=page_token,
+            ).execute()
+            for record in response.get("history", []):
+                for added in record.get("messagesAdded", []):
+                    labels = set(added["message"].get("labelIds", []))
+                    if SYNC_LABELS <= labels and not labels & EXCLUDED_LABELS:
+                        ids.append(added["message"]["id"])
+            page_token = response.get("nextPageToken")
+            if not page_token:
+                break
+    except HttpError as e:
+        # Gmail keeps about a week of history; older ids return 404
+        if e.resp.status == 404:
+            return None
+        raise
+    return list(dict.fromkeys(ids)), response["historyId"]
+
+
+def store_email_batch(db, user_id: int, items: list) -> int:
+    """
+    Insert embedded messages and their chunks in one transaction.
+
+    Emails go in as one multi-row INSERT ... ON CONFLICT (message_id) DO NOTHING,
+    so a message another sync stored first is skipped instead of failing the batch.
+    Chunks are written only for the emails this call inserted, and are handed
+    to the local vector index once the transaction commits.
+
+    Args:
+        items (list): (parse_message fields, pooled embedding, chunks) tuples.
+
+    Returns:
+        int: How many emails were stored.
+    """
+    if not items:
+        return 0
+    rows = [dict(fields, user_id=user_id, embedding=embedding) for fields, embedding, _ in items]
+    inserted = dict(db.execute(
+        insert(Email).values(rows)
+        .on_conflict_do_nothing(index_elements=["message_id"])
+        .returning(Email.message_id, Email.id)
+    ).all())
+    chunk_rows = [
+        {
+            "user_id": user_id,
+            "email_id": inserted[fields["message_id"]],
+            "chunk_index": chunk["chunk_index"],
+            "token_start": chunk["token_start"],
+            "token_end": chunk["token_end"],
+            "content": chunk["content"],
+            "embedding": chunk["embedding"],
+        }
+        for fields, _, chunks in items
+        if fields["message_id"] in inserted
+        for chunk in chunks
+    ]
+    if chunk_rows:
+        chunks = db.execute(
+            insert(DocumentChunk).returning(DocumentChunk.id, DocumentChunk.embedding), chunk_rows
+        ).all()
+        queue_inserted_chunks(db, user_id, [(chunk_id, 0, embedding) for chunk_id, embedding in chunks])
+    db.commit()
+    return len(inserted)
+
+
+def filter_new_message_ids(db, user_id: int, msg_ids: List[str]) -> list:
+    """The ids, in order, of messages not in the database yet. One query for the whole list."""
+    if not msg_ids:
+        return []
+    known = set(db.scalars(
+        select(Email.message_id).where(Email.user_id == user_id, Email.message_id.in_(msg_ids))
+    ))
+    return [msg_id for msg_id in msg_ids if msg_id not in known]
@@ -1,21 +1,164 @@
 import os
-import tiktoken
+import hashlib
+import threading
+from array import array
+from cachetools import LRUCache
 from openai import OpenAI
+from sqlalchemy.dialects.postgresql import insert
+from app.db.session import SessionLocal
+from app.models.embedding_cache import EmbeddingCache
+from app.utils.tokens import get_encoding
 
 # Initialize OpenAI client
 client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
+EMBEDDING_MODEL = "text-embedding-3-small"
+MAX_INPUT_TOKENS = 8191
+
+# Per-request limits of the embeddings endpoint
+MAX_BATCH_INPUTS = 2048
+MAX_BATCH_TOKENS = 300_000
+
+# In-process LRU in front of the embedding_cache table. Vectors are kept as
+# float32 arrays (~6 KB each), the same precision pgvector stores.
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "5000"))
+EMBEDDING_CACHE_PERSIST = os.getenv("EMBEDDING_CACHE_PERSIST", "true").lower() == "true"
+
+_memory_cache = LRUCache(maxsize=EMBEDDING_CACHE_SIZE)
+_cache_lock = threading.Lock()
+_cache_stats = {"memory_hits": 0, "db_hits": 0, "misses": 0}
+
 # Helper to truncate long text to max token limit
-def truncate_to_max_tokens(text: str, max_tokens: int, model="text-embedding-3-small") -> str:
-    enc = tiktoken.encoding_for_model(model)
+def truncate_to_max_tokens(text: str, max_tokens: int, model=EMBEDDING_MODEL) -> str:
+    enc = get_encoding(model)
     tokens = enc.encode(text)
     return enc.decode(tokens[:max_tokens])
 
+
+def embedding_cache_key(text: str, model: str = EMBEDDING_MODEL) -> str:
+    """Content address of an already-truncated input text."""
+    return hashlib.sha256(f"{model}\x00{text}".encode("utf-8")).hexdigest()
+
+
+def get_embedding_cache_stats() -> dict:
+    with _cache_lock:
+        stats = dict(_cache_stats)
+        stats["memory_size"] = len(_memory_cache)
+    lookups = stats["memory_hits"] + stats["db_hits"] + stats["misses"]
+    stats["hit_rate"] = (stats["memory_hits"] + stats["db_hits"]) / lookups if lookups else 0.0
+    return stats
+
+
+def _cache_get_many(keys: list[str]) -> dict:
+    """Look keys up in the LRU first, then in the embedding_cache table."""
+    found = {}
+    with _cache_lock:
+        for key in keys:
+            vector = _memory_cache.get(key)
+            if vector is not None:
+                found[key] = vector
+        _cache_stats["memory_hits"] += len(found)
+
+    remaining = [key for key in keys if key not in found]
+    if remaining and EMBEDDING_CACHE_PERSIST:
+        try:
+            with SessionLocal() as db:
+                rows = (
+                    db.query(EmbeddingCache.content_hash, EmbeddingCache.embedding)
+                    .filter(EmbeddingCache.content_hash.in_(remaining))
+                    .all()
+                )
+        except Exception as e:
+            # The cache must never stop embeddings from being generated
+            print("Embedding cache lookup failed:", e)
+            rows = []
+        with _cache_lock:
+            for key, vector in rows:
+                vector = array("f", vector)
+                _memory_cache[key] = vector
+                found[key] = vector
+            _cache_stats["db_hits"] += len(rows)
+
+    with _cache_lock:
+        _cache_stats["misses"] += len(keys) - len(found)
+    return found
+
+
+def _cache_put_many(entries: dict, model: str = EMBEDDING_MODEL):
+    with _cache_lock:
+        for key, vector in entries.items():
+            _memory_cache[key] = vector
+
+    if entries and EMBEDDING_CACHE_PERSIST:
+        rows = [
+            {"content_hash": key, "model": model, "embedding": list(vector)}
+            for key, vector in entries.items()
+        ]
+        try:
+            with SessionLocal() as db:
+                db.execute(insert(EmbeddingCache).values(rows).on_conflict_do_nothing(index_elements=["content_hash"]))
+                db.commit()
+        except Exception as e:
+            print("Embedding cache write failed:", e)
+
+
+def _pack_batches(token_counts: list[int]) -> list[list[int]]:
+    """Group input positions into batches that stay under the request limits."""
+    batches = []
+    batch, batch_tokens = [], 0
+    for i, n_tokens in enumerate(token_counts):
+        if batch and (len(batch) >= MAX_BATCH_INPUTS or batch_tokens + n_tokens > MAX_BATCH_TOKENS):
+            batches.append(batch)
+            batch, batch_tokens = [], 0
+        batch.append(i)
+        batch_tokens += n_tokens
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+# Generate embeddings for many texts with as few API calls as possible
+def generate_embeddings(texts: list[str]) -> list[list[float]]:
+    """
+    Embed a list of texts in token-aware batches, reusing cached vectors.
+
+    Args:
+        texts (list[str]): Texts to embed. Each one is truncated to the model's input limit.
+
+    Returns:
+        list[list[float]]: One embedding per input, in the same order as `texts`.
+    """
+    if not texts:
+        return []
+
+    enc = get_encoding(EMBEDDING_MODEL)
+    keys = []
+    to_embed = {}  # cache key -> (truncated text, token count), one entry per distinct text
+    for text in texts:
+        tokens = enc.encode(text)[:MAX_INPUT_TOKENS]
+        truncated = enc.decode(tokens)
+        key = embedding_cache_key(truncated)
+        keys.append(key)
+        to_embed.setdefault(key, (truncated, len(tokens)))
+
+    vectors = _cache_get_many(list(to_embed))
+    missing = [key for key in to_embed if key not in vectors]
+
+    fresh = {}
+    for batch in _pack_batches([to_embed[key][1] for key in missing]):
+        response = client.embeddings.create(
+            input=[to_embed[missing[i]][0] for i in batch],
+            model=EMBEDDING_MODEL
+        )
+        # The API echoes each input's position within the request
+        for item in response.data:
+            fresh[missing[batch[item.index]]] = array("f", item.embedding)
+    _cache_put_many(fresh)
+    vectors.update(fresh)
+
+    return [vectors[key].tolist() for key in keys]
+
+
 # Generate embedding with safe input length
 def generate_embedding(text: str) -> list[float]:
-    truncated_text = truncate_to_max_tokens(text, max_tokens=8191, model="text-embedding-3-small")
-    response = client.embeddings.create(
-        input=[truncated_text],
-        model="text-embedding-3-small"
-    )
-    return response.data[0].embedding
+    return generate_embeddings([text])[0]
@@ -0,0 +1,169 @@
+import os
+import time
+import threading
+from datetime import date, datetime
+from googleapiclient.errors import HttpError
+from sqlalchemy.orm import Session
+from dotenv import load_dotenv
+
+from app.db.session import SessionLocal
+from app.models.user import User
+from app.models.gmail_backfill import GmailBackfill
+from app.services.google_client import google_service
+from app.services.email import (
+    GMAIL_RATE_LIMIT_RETRIES,
+    LIST_COST,
+    SYNC_QUERY,
+    QuotaThrottle,
+    filter_new_message_ids,
+    index_unchunked_emails,
+    list_messages_page,
+)
+from app.services.ingestion import EmailIngestionPipeline
+
+load_dotenv()
+
+GMAIL_BACKFILL_PAGE_SIZE = int(os.getenv("GMAIL_BACKFILL_PAGE_SIZE", "100"))
+
+
+def _rate_limited(e: HttpError) -> bool:
+    return e.resp.status == 429 or (e.resp.status == 403 and b"rateLimitExceeded" in (e.content or b""))
+
+
+def _with_backoff(request):
+    """Run request(), sleeping and retrying when Gmail reports a rate limit."""
+    for attempt in range(GMAIL_RATE_LIMIT_RETRIES + 1):
+        try:
+            return request()
+        except HttpError as e:
+            if not _rate_limited(e) or attempt == GMAIL_RATE_LIMIT_RETRIES:
+                raise
+            time.sleep(2 ** attempt)
+
+
+def _query(backfill: GmailBackfill) -> str:
+    query = SYNC_QUERY
+    if backfill.after:
+        query += f" after:{backfill.after:%Y/%m/%d}"
+    if backfill.before:
+        query += f" before:{backfill.before:%Y/%m/%d}"
+    return query
+
+
+def start_backfill(db: Session, user_id: int, after: date = None, before: date = None) -> GmailBackfill:
+    """
+    Return the user's unfinished backfill, or one for the date window.
+
+    A failed backfill over the same window is resumed from its checkpoint;
+    otherwise a new one is created.
+    """
+    unfinished = GmailBackfill.get_unfinished(db, user_id)
+    if unfinished:
+        return unfinished[0]
+    failed = GmailBackfill.get_failed(db, user_id, after=after, before=before)
+    if failed:
+        failed.status = "pending"
+        db.commit()
+        return failed
+    backfill = GmailBackfill(user_id=user_id, after=after, before=before)
+    db.add(backfill)
+    db.commit()
+    db.refresh(backfill)
+    return backfill
+
+
+def run_backfill(backfill_id: int):
+    """
+    Page through the user's mailbox from the backfill's checkpoint.
+
+    Each page is listed, run through the ingestion pipeline, and then checkpointed with
+    the next page token, so a restarted job repeats at most one page (whose
+    stored messages are skipped). A page with messages that failed to load is
+    not checkpointed; the job fails there and resumes from that page. Calls
+    are throttled to GMAIL_QUOTA_UNITS_PER_SECOND.
+    """
+    with SessionLocal() as db:
+        backfill = db.get(GmailBackfill, backfill_id)
+        user = db.get(User, backfill.user_id)
+        backfill.status, backfill.error = "running", None
+        db.commit()
+
+        throttle = QuotaThrottle()
+        checkpoint_at = time.perf_counter()
+        try:
+            with google_service(user, "gmail", "v1") as service:
+                while True:
+                    try:
+                        throttle.spend(LIST_COST)
+                        messages, next_token = _with_backoff(lambda: list_messages_page(
+                            service, backfill.page_token, query=_query(backfill), max_results=GMAIL_BACKFILL_PAGE_SIZE
+                        ))
+                    except HttpError as e:
+                        if e.resp.status != 400 or not backfill.page_token:
+                            raise
+                        # Expired page token: list again from the top, stored messages are skipped
+                        print(f"Gmail backfill {backfill.id}: page token rejected, restarting listing")
+                        backfill.page_token = None
+                        continue
+
+                    msg_ids = [m["id"] for m in messages]
+                    new_ids = filter_new_message_ids(db, user.id, msg_ids)
+                    # The fetch workers spend the get quota per batch, from the same bucket
+                    report = EmailIngestionPipeline(user, throttle=throttle).run(new_ids)
+
+                    now = time.perf_counter()
+                    backfill.messages_stored += report["stored"]
+                    backfill.elapsed_seconds += now - checkpoint_at
+                    checkpoint_at = now
+                    if report["failed"]:
+                        # Keep the page token: this page is listed again on resume
+                        db.commit()
+                        raise RuntimeError(f"{len(report['failed'])} messages on page {backfill.pages + 1} "
+                                           "could not be fetched")
+                    backfill.page_token = next_token
+                    backfill.pages += 1
+                    backfill.messages_seen += len(msg_ids)
+                    if not next_token:
+                        backfill.status, backfill.finished_at = "completed", datetime.utcnow()
+                    db.commit()
+                    print(f"Gmail backfill {backfill.id}: page {backfill.pages}, {backfill.messages_seen} seen, "
+                          f"{backfill.messages_stored} stored, {backfill.messages_per_second:.1f} msgs/sec")
+                    if not next_token:
+                        break
+            index_unchunked_emails(user, db)
+        except Exception as e:
+            print(f"Gmail backfill {backfill_id} failed:", e)
+            db.rollback()
+            backfill.status, backfill.error = "failed", str(e)
+            db.commit()
+
+
+_running = set()
+_running_lock = threading.Lock()
+
+
+def launch_backfill(backfill_id: int) -> bool:
+    """Run a backfill in a background thread, unless it is already running in this process."""
+    with _running_lock:
+        if backfill_id in _running:
+            return False
+        _running.add(backfill_id)
+
+    def target():
+        try:
+            run_backfill(backfill_id)
+        finally:
+            with _running_lock:
+                _running.discard(backfill_id)
+
+    threading.Thread(target=target, name=f"gmail-backfill-{backfill_id}", daemon=True).start()
+    return True
+
+
+def resume_backfills():
+    """Restart backfills interrupted by a crash or restart, from their checkpoints. Failed ones are left alone."""
+    with SessionLocal() as db:
+        backfill_ids = [backfill.id for backfill in GmailBackfill.get_unfinished(db)]
+    for backfill_id in backfill_ids:
+        print(f"Resuming Gmail backfill {backfill_id}")
+        launch_backfill(backfill_id)
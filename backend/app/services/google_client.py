@@ -0,0 +1,133 @@
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import httplib2
+from google.oauth2.credentials import Credentials
+from google_auth_httplib2 import AuthorizedHttp
+from googleapiclient.discovery import build
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# (user, API) pools kept; the least recently used are dropped first
+GOOGLE_CLIENT_CACHE_SIZE = int(os.getenv("GOOGLE_CLIENT_CACHE_SIZE", "256"))
+# Idle clients kept per user and API. httplib2 connections are not thread-safe,
+# so calls running at the same time each check out their own client.
+GOOGLE_CLIENTS_PER_USER = int(os.getenv("GOOGLE_CLIENTS_PER_USER", "2"))
+# Below the google tool timeout (tool_engine), so a stuck request fails in its
+# own thread before the caller gives up on it
+GOOGLE_HTTP_TIMEOUT = float(os.getenv("GOOGLE_HTTP_TIMEOUT", "15"))
+
+TOKEN_URI = "https://oauth2.googleapis.com/token"
+
+
+class _Pool:
+    def __init__(self, fingerprint: tuple):
+        self.fingerprint = fingerprint
+        self.idle = []
+
+
+class GoogleClientCache:
+    """
+    Pools built Google API clients per (user, api, version).
+
+    Clients are built once from the discovery documents bundled with
+    google-api-python-client and keep their HTTPS connection open between calls.
+    A pool is dropped when the user's stored tokens change or when it is the
+    least recently used one and the cache is full.
+    """
+
+    def __init__(self, maxsize: int = GOOGLE_CLIENT_CACHE_SIZE, per_user: int = GOOGLE_CLIENTS_PER_USER):
+        self.maxsize = maxsize
+        self.per_user = per_user
+        self._pools: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "builds": 0, "evictions": 0, "invalidations": 0}
+
+    @staticmethod
+    def _fingerprint(user) -> tuple:
+        return user.google_access_token, user.google_refresh_token
+
+    @staticmethod
+    def _build(user, api: str, version: str):
+        creds = Credentials(
+            token=user.google_access_token,
+            refresh_token=user.google_refresh_token,
+            token_uri=TOKEN_URI,
+            client_id=os.getenv("GOOGLE_CLIENT_ID"),
+            client_secret=os.getenv("GOOGLE_CLIENT_SECRET"),
+        )
+        http = AuthorizedHttp(creds, http=httplib2.Http(timeout=GOOGLE_HTTP_TIMEOUT))
+        return build(api, version, http=http, static_discovery=True, cache_discovery=False)
+
+    def _checkout(self, user, api: str, version: str):
+        key = (user.id, api, version)
+        fingerprint = self._fingerprint(user)
+        with self._lock:
+            pool = self._pools.get(key)
+            if pool is not None and pool.fingerprint != fingerprint:
+                # Tokens were replaced (reconnect or refresh elsewhere)
+                self._stats["invalidations"] += 1
+                pool = None
+            if pool is None:
+                pool = self._pools[key] = _Pool(fingerprint)
+            self._pools.move_to_end(key)
+            while len(self._pools) > self.maxsize:
+                self._pools.popitem(last=False)
+                self._stats["evictions"] += 1
+            if pool.idle:
+                self._stats["hits"] += 1
+                return key, pool, pool.idle.pop()
+            self._stats["builds"] += 1
+        # Building does no network I/O but is not free; do it outside the lock
+        return key, pool, self._build(user, api, version)
+
+    def _checkin(self, key: tuple, pool: _Pool, service):
+        with self._lock:
+            # Skip pools that were invalidated or evicted while the client was out
+            if self._pools.get(key) is pool and len(pool.idle) < self.per_user:
+                pool.idle.append(service)
+
+    @contextmanager
+    def service(self, user, api: str, version: str):
+        """
+        Check out a client for the user; it returns to the pool afterwards.
+
+        Args:
+            user (User): Must have Google tokens.
+            api (str): e.g. "gmail" or "calendar".
+            version (str): e.g. "v1" or "v3".
+        """
+        key, pool, service = self._checkout(user, api, version)
+        yield service
+        # Not reached if the call raised: its connection may be in a bad state
+        self._checkin(key, pool, service)
+
+    def invalidate(self, user_id: int):
+        with self._lock:
+            stale = [key for key in self._pools if key[0] == user_id]
+            for key in stale:
+                del self._pools[key]
+            self._stats["invalidations"] += len(stale)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats, users=len({key[0] for key in self._pools}), pools=len(self._pools))
+
+
+google_clients = GoogleClientCache()
+
+
+def google_service(user, api: str, version: str):
+    """Context manager yielding a pooled API client, e.g. google_service(user, "gmail", "v1")."""
+    return google_clients.service(user, api, version)
+
+
+def invalidate_google_clients(user_id: int):
+    google_clients.invalidate(user_id)
+
+
+def get_google_client_stats() -> dict:
+    return google_clients.get_stats()
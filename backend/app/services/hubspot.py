@@ -4,11 +4,14 @@ from sqlalchemy.orm import Session
 from app.models.user import User
 from app.models.contact import Contact
 from app.models.contact_note import ContactNote
-from app.services.embedding import generate_embedding
+from app.models.document_chunk import DocumentChunk
+from app.services.chunking import embed_documents, index_unchunked
+from app.core.tool_registry import tool
 import requests
 from bs4 import BeautifulSoup
 
 
+@tool("Create a contact in HubSpot", integration="hubspot")
 def create_contact(
     user_id: int,
     email: str,
@@ -39,6 +42,7 @@ def create_contact(
 
 
 # Legacy note creation using Engagements API (because notes scope is unavailable)
+@tool("Attach a note to a HubSpot contact", integration="hubspot", params={"contact_vid": "HubSpot contact ID"})
 def add_note_to_hubspot(user_id: int, contact_vid: int, content: str, db: Session = None) -> str:
     user = db.query(User).filter_by(id=user_id).first()
     if not user or not user.hubspot_access_token:
@@ -102,6 +106,8 @@ def sync_hubspot_data(user: User, db: Session):
         headers = {"Authorization": f"Bearer {user.hubspot_access_token}"}
         has_more = True
         offset = 0
+        pending = []  # (contact_id, cleaned_content) pairs that still need an embedding
+        seen = set()
 
         while has_more:
             params = {"limit": 100, "offset": offset}
@@ -117,29 +123,48 @@ def sync_hubspot_data(user: User, db: Session):
                 if not cleaned_content:
                     continue
 
-                embedding = generate_embedding(cleaned_content)
                 associations = engagement.get("associations", {}).get("contactIds", [])
 
                 for contact_vid in associations:
                     contact = db.query(Contact).filter_by(user_id=user.id, hubspot_id=str(contact_vid)).first()
-                    if contact:
-                        existing_note = db.query(ContactNote).filter_by(user_id=user.id, contact_id=contact.id, content=content).first()
-                        if not existing_note:
-                            ContactNote.create(
-                                db=db,
-                                user_id=user.id,
-                                contact_id=contact.id,
-                                content=cleaned_content,
-                                embedding=embedding
-                            )
+                    if not contact or (contact.id, cleaned_content) in seen:
+                        continue
+                    # Notes are stored cleaned, so compare against the cleaned text
+                    existing_note = db.query(ContactNote).filter_by(user_id=user.id, contact_id=contact.id, content=cleaned_content).first()
+                    if not existing_note:
+                        pending.append((contact.id, cleaned_content))
+                        seen.add((contact.id, cleaned_content))
 
             has_more = res.get("hasMore", False)
             offset = res.get("offset", 0)
 
+        # Chunk and embed each distinct note body once, in bulk
+        unique_contents = list(dict.fromkeys(content for _, content in pending))
+        embeddings, chunked = embed_documents(unique_contents)
+        embedded = dict(zip(unique_contents, zip(embeddings, chunked)))
+
+        for contact_id, cleaned_content in pending:
+            embedding, chunks = embedded[cleaned_content]
+            note = ContactNote.create(
+                db=db,
+                user_id=user.id,
+                contact_id=contact_id,
+                content=cleaned_content,
+                embedding=embedding
+            )
+            DocumentChunk.create_many(db, user_id=user.id, chunks=chunks, contact_note_id=note.id)
+
+        index_unchunked_notes(user, db)
+
     except Exception as e:
         print("HubSpot notes sync failed:", e)
 
 
+def index_unchunked_notes(user: User, db: Session):
+    """Chunk and embed notes that were stored before chunked embeddings existed."""
+    return index_unchunked(db, user.id, ContactNote, ContactNote.content, "contact_note_id")
+
+
 def strip_html(html: str) -> str:
     """Remove HTML tags and return plain text."""
     return BeautifulSoup(html, "html.parser").get_text().strip()
@@ -147,6 +172,7 @@ def strip_html(html: str) -> str:
 
 from hubspot.crm.contacts import ApiException as ContactApiException
 
+@tool("Finds a contact by name or email in HubSpot/CRM.", read_only=True, integration="hubspot")
 def find_contact(
     user_id: int,
     email: str = "",
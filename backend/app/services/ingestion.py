@@ -0,0 +1,280 @@
+import os
+import time
+import queue
+import threading
+from types import SimpleNamespace
+from dataclasses import dataclass
+
+from app.db.session import SessionLocal
+from app.models.gmail_sync_state import GmailSyncState
+from app.services.chunking import embed_documents
+from app.services.google_client import google_service
+from app.services.email import (
+    GET_COST,
+    GMAIL_RATE_LIMIT_RETRIES,
+    filter_new_message_ids,
+    get_messages,
+    index_unchunked_emails,
+    list_history_message_ids,
+    list_recent_messages,
+    parse_message,
+    store_email_batch,
+)
+
+# Concurrent Gmail fetchers and the message ids each one requests per batch call
+INGEST_FETCH_WORKERS = int(os.getenv("INGEST_FETCH_WORKERS", "4"))
+INGEST_FETCH_BATCH = int(os.getenv("INGEST_FETCH_BATCH", "50"))
+# Messages per embedding call and per insert transaction
+INGEST_EMBED_BATCH = int(os.getenv("INGEST_EMBED_BATCH", "32"))
+INGEST_STORE_BATCH = int(os.getenv("INGEST_STORE_BATCH", "64"))
+# Capacity of each queue between stages; a full queue blocks the stage before it
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "128"))
+# How long a partial batch waits for more messages before it is flushed
+INGEST_FLUSH_SECONDS = float(os.getenv("INGEST_FLUSH_SECONDS", "0.5"))
+
+_DONE = object()
+
+
+@dataclass
+class StageStats:
+    name: str
+    items: int = 0
+    busy_seconds: float = 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "items": self.items,
+            "busy_seconds": round(self.busy_seconds, 3),
+            # Throughput while working, so a stage starved by the one before it is not blamed
+            "items_per_second": round(self.items / self.busy_seconds, 1) if self.busy_seconds else 0.0,
+        }
+
+
+class _Stopped(Exception):
+    pass
+
+
+class EmailIngestionPipeline:
+    """
+    Fetch -> parse -> embed -> store, each stage in its own thread(s).
+
+    Stages are connected by bounded queues, so Gmail, OpenAI and Postgres are
+    busy at the same time while at most INGEST_QUEUE_SIZE messages wait between
+    two stages. The fetch stage runs INGEST_FETCH_WORKERS batch requests at
+    once; the embed and store stages work on micro-batches. If a stage fails,
+    the others stop and run() raises the error. Failed message gets are
+    retried with exponential backoff; ids that still fail are reported in
+    run()'s "failed" list.
+
+    Args:
+        user (User): Owner of the mailbox.
+        throttle (QuotaThrottle): Optional quota bucket the fetch workers spend
+            from before every batch request, retries included.
+    """
+
+    def __init__(self, user, throttle=None):
+        # A detached copy: the caller's ORM object must not be touched from other threads
+        self.user = SimpleNamespace(
+            id=user.id,
+            google_access_token=user.google_access_token,
+            google_refresh_token=user.google_refresh_token,
+        )
+        self.stats = {name: StageStats(name) for name in ("fetch", "parse", "embed", "store")}
+        self._stop = threading.Event()
+        self._stats_lock = threading.Lock()  # the fetch workers share their stats
+        self._errors = []
+        self.failed = []
+        self.throttle = throttle
+
+    def _put(self, q: queue.Queue, item):
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=INGEST_FLUSH_SECONDS)
+                return
+            except queue.Full:
+                continue
+        raise _Stopped()
+
+    def _get(self, q: queue.Queue, timeout: float = None):
+        """Next item, or None if nothing arrived within timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self._stop.is_set():
+            wait = INGEST_FLUSH_SECONDS if deadline is None else min(INGEST_FLUSH_SECONDS, deadline - time.monotonic())
+            if wait <= 0:
+                return None
+            try:
+                return q.get(timeout=wait)
+            except queue.Empty:
+                continue
+        raise _Stopped()
+
+    def _stage(self, func, *args):
+        def target():
+            try:
+                func(*args)
+            except _Stopped:
+                pass
+            except Exception as e:
+                print(f"Ingestion stage {func.__name__} failed:", e)
+                self._errors.append(e)
+                self._stop.set()
+        thread = threading.Thread(target=target, name=f"ingest-{func.__name__.strip('_')}", daemon=True)
+        thread.start()
+        return thread
+
+    def _batched(self, q: queue.Queue, size: int):
+        """Yield lists of up to size items from q, flushing early when it runs dry, until _DONE."""
+        batch = []
+        while True:
+            item = self._get(q, timeout=INGEST_FLUSH_SECONDS if batch else None)
+            if item is _DONE:
+                if batch:
+                    yield batch
+                return
+            if item is None:
+                yield batch
+                batch = []
+                continue
+            batch.append(item)
+            if len(batch) >= size:
+                yield batch
+                batch = []
+
+    def _get_messages(self, service, msg_ids: list):
+        if self.throttle is not None:
+            self.throttle.spend(GET_COST * len(msg_ids))
+        return get_messages(service, msg_ids)
+
+    def _fetch(self, id_batches: queue.Queue, raw: queue.Queue):
+        stats = self.stats["fetch"]
+        with google_service(self.user, "gmail", "v1") as service:
+            while True:
+                try:
+                    msg_ids = id_batches.get_nowait()
+                except queue.Empty:
+                    return
+                started = time.perf_counter()
+                fetched, failed = self._get_messages(service, msg_ids)
+                for attempt in range(GMAIL_RATE_LIMIT_RETRIES):
+                    if not failed:
+                        break
+                    # Usually rate-limited sub-requests; back off before asking again
+                    time.sleep(2 ** attempt)
+                    retried, failed = self._get_messages(service, failed)
+                    fetched.update(retried)
+                with self._stats_lock:
+                    stats.busy_seconds += time.perf_counter() - started
+                    stats.items += len(fetched)
+                    self.failed.extend(failed)
+                for msg_id in msg_ids:
+                    if msg_id in fetched:
+                        self._put(raw, fetched[msg_id])
+
+    def _parse(self, raw: queue.Queue, parsed: queue.Queue):
+        stats = self.stats["parse"]
+        while True:
+            msg = self._get(raw)
+            if msg is _DONE:
+                self._put(parsed, _DONE)
+                return
+            started = time.perf_counter()
+            fields = parse_message(msg)
+            stats.busy_seconds += time.perf_counter() - started
+            stats.items += 1
+            if fields:
+                self._put(parsed, fields)
+
+    def _embed(self, parsed: queue.Queue, embedded: queue.Queue):
+        stats = self.stats["embed"]
+        for batch in self._batched(parsed, INGEST_EMBED_BATCH):
+            started = time.perf_counter()
+            # The row-level embedding is pooled from the chunk vectors
+            embeddings, chunked = embed_documents([fields["body_text"] for fields in batch])
+            stats.busy_seconds += time.perf_counter() - started
+            stats.items += len(batch)
+            for item in zip(batch, embeddings, chunked):
+                self._put(embedded, item)
+        self._put(embedded, _DONE)
+
+    def _store(self, embedded: queue.Queue):
+        stats = self.stats["store"]
+        with SessionLocal() as db:
+            for batch in self._batched(embedded, INGEST_STORE_BATCH):
+                started = time.perf_counter()
+                stats.items += store_email_batch(db, self.user.id, batch)
+                stats.busy_seconds += time.perf_counter() - started
+
+    def run(self, msg_ids: list) -> dict:
+        """
+        Ingest the given message ids, which should not be stored yet.
+
+        Returns:
+            dict: Per-stage stats, the number of emails stored, the ids that
+            could not be fetched and the overall rate.
+        """
+        started = time.perf_counter()
+        id_batches = queue.Queue()
+        for start in range(0, len(msg_ids), INGEST_FETCH_BATCH):
+            id_batches.put(msg_ids[start:start + INGEST_FETCH_BATCH])
+        raw, parsed, embedded = (queue.Queue(maxsize=INGEST_QUEUE_SIZE) for _ in range(3))
+
+        workers = min(INGEST_FETCH_WORKERS, id_batches.qsize())
+        fetchers = [self._stage(self._fetch, id_batches, raw) for _ in range(workers)]
+        downstream = [
+            self._stage(self._parse, raw, parsed),
+            self._stage(self._embed, parsed, embedded),
+            self._stage(self._store, embedded),
+        ]
+        for thread in fetchers:
+            thread.join()
+        try:
+            self._put(raw, _DONE)
+        except _Stopped:
+            pass  # a stage failed; its error is raised below
+        for thread in downstream:
+            thread.join()
+        if self._errors:
+            raise self._errors[0]
+
+        elapsed = time.perf_counter() - started
+        stored = self.stats["store"].items
+        report = {
+            "stages": {name: stats.to_dict() for name, stats in self.stats.items()},
+            "stored": stored,
+            "failed": self.failed,
+            "elapsed_seconds": round(elapsed, 3),
+            "messages_per_second": round(stored / elapsed, 1) if elapsed else 0.0,
+        }
+        print(f"Ingested {stored} emails for user {self.user.id}:", report)
+        return report
+
+
+def sync_gmail_emails(user, db):
+    """
+    Store the user's new Gmail messages.
+
+    After the first run, only messages added since the stored historyId are
+    fetched. When there is no stored historyId, or it has expired, the latest
+    messages are listed instead.
+    """
+    state = GmailSyncState.get_or_create(db, user.id)
+    with google_service(user, "gmail", "v1") as service:
+        changes = list_history_message_ids(service, state.history_id) if state.history_id else None
+        if changes is None:
+            print(f"Full Gmail sync for user {user.id}")
+            # Read the historyId first, so mail arriving during the listing is picked up next time
+            history_id = service.users().getProfile(userId="me").execute()["historyId"]
+            msg_ids = [m["id"] for m in list_recent_messages(service)]
+        else:
+            msg_ids, history_id = changes
+
+    report = EmailIngestionPipeline(user).run(filter_new_message_ids(db, user.id, msg_ids))
+    index_unchunked_emails(user, db)
+    if report["failed"]:
+        # Keep the old historyId so the next sync lists these messages again;
+        # the ones stored now are skipped then
+        print(f"Gmail sync for user {user.id}: {len(report['failed'])} messages failed to load, "
+              "historyId not advanced")
+        return
+    # Advanced only once everything is stored, so a failed run is retried
+    state.mark_synced(db, history_id)
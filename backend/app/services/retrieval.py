@@ -0,0 +1,270 @@
+import os
+from dataclasses import dataclass, field
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import text
+from app.db.vector import set_vector_search_params
+from app.services.chunking import stitch_chunks
+from app.services.vector_index import local_index, enable_incremental_updates
+
+# Number of best-matching chunks pulled per source for the RAG context
+RAG_CHUNK_LIMIT = int(os.getenv("RAG_CHUNK_LIMIT", "12"))
+RAG_INSTRUCTION_LIMIT = int(os.getenv("RAG_INSTRUCTION_LIMIT", "20"))
+
+# Reciprocal rank fusion constant and how many candidates each ranking contributes
+RRF_K = int(os.getenv("RRF_K", "60"))
+HYBRID_CANDIDATE_FACTOR = int(os.getenv("HYBRID_CANDIDATE_FACTOR", "4"))
+
+# Where the vector ranking runs: "pgvector" (HNSW in Postgres) or "local"
+# (per-user NumPy matrices in this process, see app.services.vector_index)
+RETRIEVAL_BACKEND = os.getenv("RETRIEVAL_BACKEND", "pgvector")
+if RETRIEVAL_BACKEND == "local":
+    enable_incremental_updates()
+
+# Vector candidates as (chunk_id, source, distance). Each branch is a plain
+# ORDER BY ... LIMIT on document_chunks so it can use the HNSW index.
+PGVECTOR_HITS_SQL = """
+    (SELECT id AS chunk_id, 'email' AS source, embedding <#> (:embedding)::vector AS distance
+     FROM document_chunks
+     WHERE user_id = :user_id AND email_id IS NOT NULL
+     ORDER BY distance
+     LIMIT :email_candidates)
+    UNION ALL
+    (SELECT id, 'note', embedding <#> (:embedding)::vector AS distance
+     FROM document_chunks
+     WHERE user_id = :user_id AND contact_note_id IS NOT NULL
+     ORDER BY distance
+     LIMIT :note_candidates)
+"""
+
+# Same shape, with the ranking done by the local index and passed in as arrays
+LOCAL_HITS_SQL = """
+    SELECT v.chunk_id, v.source, v.distance
+    FROM unnest(
+        CAST(:vector_chunk_ids AS integer[]),
+        CAST(:vector_sources AS text[]),
+        CAST(:vector_distances AS float8[])
+    ) AS v(chunk_id, source, distance)
+"""
+
+# Query terms are OR-ed so a question still matches chunks containing only the
+# exact name, account number or ticker it mentions.
+LEXICAL_HITS_SQL = """
+    (SELECT c.id AS chunk_id, 'email' AS source, ts_rank_cd(c.search_vector, query.q) AS lexical_rank
+     FROM document_chunks c, query
+     WHERE c.user_id = :user_id AND c.email_id IS NOT NULL AND c.search_vector @@ query.q
+     ORDER BY lexical_rank DESC
+     LIMIT :email_candidates)
+    UNION ALL
+    (SELECT c.id, 'note', ts_rank_cd(c.search_vector, query.q) AS lexical_rank
+     FROM document_chunks c, query
+     WHERE c.user_id = :user_id AND c.contact_note_id IS NOT NULL AND c.search_vector @@ query.q
+     ORDER BY lexical_rank DESC
+     LIMIT :note_candidates)
+"""
+
+CHUNK_ROWS_SQL = """
+    SELECT t.source, COALESCE(c.email_id, c.contact_note_id) AS parent_id, c.id AS chunk_id,
+           c.token_start, c.token_end, c.content, t.score::float8 AS score,
+           e.subject, e.sender, e.recipient, NULL::timestamp AS created_at
+    FROM top_chunks t
+    JOIN document_chunks c ON c.id = t.chunk_id
+    LEFT JOIN emails e ON e.id = c.email_id
+"""
+
+INSTRUCTIONS_SQL = """
+    SELECT * FROM (
+        SELECT 'instruction', i.id, NULL::integer, NULL::integer, NULL::integer,
+               i.condition || ' → ' || i.action, NULL::float8, NULL, NULL, NULL, i.created_at
+        FROM instructions i
+        WHERE i.user_id = :user_id AND i.active = true
+        ORDER BY i.created_at DESC
+        LIMIT :instruction_k
+    ) active_instructions
+"""
+
+
+def _vector_statement(hits_sql: str):
+    # Rows are re-sorted by score in build_hits, which keeps the ranking exact
+    # when hnsw.iterative_scan is relaxed_order.
+    return text(f"""
+        WITH vector_hits AS MATERIALIZED ({hits_sql}),
+        top_chunks AS (
+            SELECT chunk_id, source, -distance AS score FROM vector_hits
+        )
+        {CHUNK_ROWS_SQL}
+        UNION ALL
+        {INSTRUCTIONS_SQL}
+    """)
+
+
+def _hybrid_statement(hits_sql: str):
+    # The vector ranking and a GIN full-text ranking of the same chunks are fused
+    # per source with reciprocal rank fusion, score = sum(1 / (RRF_K + rank)).
+    return text(f"""
+        WITH query AS (
+            SELECT replace(plainto_tsquery('english', :query_text)::text, '&', '|')::tsquery AS q
+        ),
+        vector_hits AS MATERIALIZED ({hits_sql}),
+        lexical_hits AS MATERIALIZED ({LEXICAL_HITS_SQL}),
+        ranked AS (
+            SELECT chunk_id, source, ROW_NUMBER() OVER (PARTITION BY source ORDER BY distance, chunk_id) AS rank
+            FROM vector_hits
+            UNION ALL
+            SELECT chunk_id, source, ROW_NUMBER() OVER (PARTITION BY source ORDER BY lexical_rank DESC, chunk_id)
+            FROM lexical_hits
+        ),
+        fused AS (
+            SELECT chunk_id, source, SUM(1.0 / (:rrf_k + rank)) AS score,
+                   ROW_NUMBER() OVER (PARTITION BY source ORDER BY SUM(1.0 / (:rrf_k + rank)) DESC, chunk_id) AS position
+            FROM ranked
+            GROUP BY chunk_id, source
+        ),
+        top_chunks AS (
+            SELECT chunk_id, source, score FROM fused
+            WHERE position <= CASE source WHEN 'email' THEN :email_k ELSE :note_k END
+        )
+        {CHUNK_ROWS_SQL}
+        UNION ALL
+        {INSTRUCTIONS_SQL}
+    """)
+
+
+# One statement, one round trip, for each (backend, hybrid) combination
+STATEMENTS = {
+    ("pgvector", False): _vector_statement(PGVECTOR_HITS_SQL),
+    ("pgvector", True): _hybrid_statement(PGVECTOR_HITS_SQL),
+    ("local", False): _vector_statement(LOCAL_HITS_SQL),
+    ("local", True): _hybrid_statement(LOCAL_HITS_SQL),
+}
+
+SOURCE_ORDER = {"email": 0, "note": 1, "instruction": 2}
+
+
+@dataclass
+class RetrievalHit:
+    source: str         # "email", "note" or "instruction"
+    document_id: int    # id of the parent email, contact note or instruction
+    score: float        # relevance (higher is better): inner product, or RRF score for hybrid search; None for instructions
+    text: str           # stitched chunk text (or "condition → action" for instructions)
+    metadata: dict = field(default_factory=dict)
+    chunk_ids: list = field(default_factory=list)
+
+    @property
+    def key(self) -> str:
+        """Identifies the document across searches, e.g. "email:42"."""
+        return f"{self.source}:{self.document_id}"
+
+    def to_context(self) -> str:
+        if self.source == "email":
+            return (
+                f"From: {self.metadata.get('sender')}\nTo: {self.metadata.get('recipient')}\n"
+                f"Subject: {self.metadata.get('subject')}\n\n{self.text}"
+            )
+        if self.source == "instruction":
+            return f"Instruction: {self.text}"
+        return self.text
+
+
+class RetrievalService:
+    """Ranked retrieval over a user's emails, contact notes and active instructions."""
+
+    def __init__(self, db: Session, backend: str = RETRIEVAL_BACKEND):
+        self.db = db
+        self.backend = backend
+
+    def search(
+        self,
+        user_id: int,
+        query_embedding: list[float],
+        email_k: int = RAG_CHUNK_LIMIT,
+        note_k: int = RAG_CHUNK_LIMIT,
+        instruction_k: int = RAG_INSTRUCTION_LIMIT,
+        ef_search: int = None,
+        query_text: str = None,
+    ) -> list[RetrievalHit]:
+        """
+        Return the best hits of every source in one database round trip.
+
+        Args:
+            user_id (int): Owner of the documents.
+            query_embedding (list[float]): Query vector.
+            email_k (int): Number of email chunks to rank.
+            note_k (int): Number of note chunks to rank.
+            instruction_k (int): Maximum number of active instructions.
+            ef_search (int): Optional hnsw.ef_search override for this query.
+            query_text (str): Raw query. When given, full-text and vector rankings are fused.
+
+        Returns:
+            list[RetrievalHit]: One hit per document, grouped by source and ordered
+            by the score of its best chunk.
+        """
+        hybrid = bool(query_text)
+        factor = HYBRID_CANDIDATE_FACTOR if hybrid else 1
+        params = {
+            "user_id": user_id,
+            "embedding": query_embedding,
+            "email_k": email_k,
+            "note_k": note_k,
+            "instruction_k": instruction_k,
+            "email_candidates": email_k * factor,
+            "note_candidates": note_k * factor,
+        }
+        if hybrid:
+            params.update({"query_text": query_text, "rrf_k": RRF_K})
+
+        backend = self.backend
+        if backend == "local":
+            ranked = local_index.search(self.db, user_id, query_embedding, {
+                "email": params["email_candidates"],
+                "note": params["note_candidates"],
+            })
+            if ranked is None:
+                backend = "pgvector"  # user does not fit in the local memory budget
+            else:
+                params.update({
+                    "vector_chunk_ids": [chunk_id for chunk_id, _, _ in ranked],
+                    "vector_sources": [source for _, source, _ in ranked],
+                    "vector_distances": [-score for _, _, score in ranked],
+                })
+
+        if backend == "pgvector" and ef_search:
+            set_vector_search_params(self.db, ef_search=ef_search, limit=max(email_k, note_k) * factor)
+
+        rows = self.db.execute(STATEMENTS[(backend, hybrid)], params).fetchall()
+        return self.build_hits(rows)
+
+    @staticmethod
+    def build_hits(rows) -> list[RetrievalHit]:
+        """Group ranked chunk rows into one hit per parent document."""
+        rows = sorted(rows, key=lambda row: (
+            SOURCE_ORDER[row.source],
+            -row.score if row.score is not None else 0.0,
+            row.chunk_id or 0,
+            -row.created_at.timestamp() if row.created_at else 0.0,
+        ))
+        hits = {}
+        chunks = {}
+        for row in rows:
+            key = (row.source, row.parent_id)
+            if key not in hits:
+                hits[key] = RetrievalHit(
+                    source=row.source,
+                    document_id=row.parent_id,
+                    score=row.score,
+                    text=row.content,
+                    metadata={"subject": row.subject, "sender": row.sender, "recipient": row.recipient}
+                    if row.source == "email" else {},
+                )
+                chunks[key] = []
+            if row.chunk_id is not None:
+                hits[key].chunk_ids.append(row.chunk_id)
+                chunks[key].append({
+                    "token_start": row.token_start,
+                    "token_end": row.token_end,
+                    "content": row.content,
+                })
+
+        for key, hit in hits.items():
+            if chunks[key]:
+                hit.text = stitch_chunks(chunks[key])
+        return list(hits.values())
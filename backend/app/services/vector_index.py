@@ -0,0 +1,242 @@
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app.models.document_chunk import DocumentChunk
+
+# Memory the per-user matrices may use in total before the least recently used
+# users are evicted, and the precision vectors are kept in ("float32" or "float16").
+LOCAL_INDEX_MEMORY_MB = int(os.getenv("LOCAL_INDEX_MEMORY_MB", "512"))
+LOCAL_INDEX_DTYPE = np.dtype(os.getenv("LOCAL_INDEX_DTYPE", "float32"))
+
+EMBEDDING_DIMENSIONS = 1536
+SCORE_BLOCK_ROWS = 32768
+SOURCES = ("email", "note")
+
+
+class _UserMatrix:
+    """Embeddings of one user's chunks as a growable row-major matrix."""
+
+    def __init__(self, capacity: int = 256):
+        self.vectors = np.empty((capacity, EMBEDDING_DIMENSIONS), dtype=LOCAL_INDEX_DTYPE)
+        self.chunk_ids = np.empty(capacity, dtype=np.int64)
+        self.sources = np.empty(capacity, dtype=np.int8)
+        self.size = 0
+        self.known = set()
+
+    @property
+    def nbytes(self) -> int:
+        return self.vectors.nbytes + self.chunk_ids.nbytes + self.sources.nbytes
+
+    def add(self, rows: list[tuple]):
+        """Append (chunk_id, source index, vector) rows, skipping chunks already present."""
+        rows = [row for row in rows if row[0] not in self.known]
+        if not rows:
+            return
+        needed = self.size + len(rows)
+        if needed > len(self.chunk_ids):
+            capacity = max(needed, len(self.chunk_ids) * 2)
+            self.vectors = np.resize(self.vectors, (capacity, EMBEDDING_DIMENSIONS))
+            self.chunk_ids = np.resize(self.chunk_ids, capacity)
+            self.sources = np.resize(self.sources, capacity)
+        for chunk_id, source, vector in rows:
+            self.vectors[self.size] = vector
+            self.chunk_ids[self.size] = chunk_id
+            self.sources[self.size] = source
+            self.known.add(chunk_id)
+            self.size += 1
+
+    def scores(self, query: np.ndarray) -> np.ndarray:
+        """Inner product of every row with the query, computed in float32 blocks."""
+        scores = np.empty(self.size, dtype=np.float32)
+        for start in range(0, self.size, SCORE_BLOCK_ROWS):
+            end = min(start + SCORE_BLOCK_ROWS, self.size)
+            scores[start:end] = self.vectors[start:end].astype(np.float32, copy=False) @ query
+        return scores
+
+
+def _top_k(scores: np.ndarray, chunk_ids: np.ndarray, k: int) -> np.ndarray:
+    """Positions of the k best scores, ordered by score desc then chunk id asc."""
+    if k <= 0 or not len(scores):
+        return np.empty(0, dtype=np.int64)
+    if k < len(scores):
+        # Keep everything tied with the k-th score so ties resolve by chunk id, as in SQL
+        kth = np.partition(scores, len(scores) - k)[len(scores) - k]
+        candidates = np.flatnonzero(scores >= kth)
+    else:
+        candidates = np.arange(len(scores))
+    order = np.lexsort((chunk_ids[candidates], -scores[candidates]))
+    return candidates[order[:k]]
+
+
+class LocalVectorIndex:
+    """
+    In-process exact inner-product search over per-user chunk embeddings.
+
+    A user's matrix is loaded from document_chunks on their first search and
+    kept in an LRU bounded by LOCAL_INDEX_MEMORY_MB. New chunks are appended
+    when the session that inserted them commits, so the index never needs a
+    full reload after a sync.
+    """
+
+    def __init__(self, memory_bytes: int = LOCAL_INDEX_MEMORY_MB * 1024 * 1024):
+        self.memory_bytes = memory_bytes
+        self._users = OrderedDict()
+        self._loading = {}  # user_id -> rows committed while the user was being loaded
+        self._lock = threading.RLock()
+        self._stats = {"hits": 0, "loads": 0, "evictions": 0, "fallbacks": 0}
+
+    def _load(self, db: Session, user_id: int):
+        with self._lock:
+            matrix = self._users.get(user_id)
+            if matrix is not None:
+                self._users.move_to_end(user_id)
+                self._stats["hits"] += 1
+                return matrix
+            self._loading.setdefault(user_id, [])
+
+        try:
+            rows = (
+                db.query(DocumentChunk.id, DocumentChunk.contact_note_id, DocumentChunk.embedding)
+                .filter(DocumentChunk.user_id == user_id, DocumentChunk.embedding.isnot(None))
+                .order_by(DocumentChunk.id)
+                .all()
+            )
+            matrix = _UserMatrix(capacity=max(len(rows), 1))
+            matrix.add([
+                (chunk_id, 0 if note_id is None else 1, embedding)
+                for chunk_id, note_id, embedding in rows
+            ])
+        except Exception:
+            with self._lock:
+                self._loading.pop(user_id, None)
+            raise
+
+        with self._lock:
+            matrix.add(self._loading.pop(user_id, []))
+            self._stats["loads"] += 1
+            if matrix.nbytes > self.memory_bytes:
+                self._stats["fallbacks"] += 1
+                return None
+            self._users[user_id] = matrix
+            self._evict()
+            return matrix
+
+    def _evict(self):
+        used = sum(matrix.nbytes for matrix in self._users.values())
+        while used > self.memory_bytes and len(self._users) > 1:
+            _, matrix = self._users.popitem(last=False)
+            used -= matrix.nbytes
+            self._stats["evictions"] += 1
+
+    def search(self, db: Session, user_id: int, query: list[float], limits: dict) -> list[tuple] | None:
+        """
+        Rank a user's chunks by inner product with the query.
+
+        Args:
+            db (Session): Session used to load the user's matrix on first use.
+            user_id (int): Owner of the chunks.
+            query (list[float]): Query embedding.
+            limits (dict): Number of chunks to return per source, e.g. {"email": 12, "note": 12}.
+
+        Returns:
+            list[tuple] | None: (chunk_id, source, score) ordered like the pgvector
+            query, or None when the user does not fit in the memory budget.
+        """
+        matrix = self._load(db, user_id)
+        if matrix is None:
+            return None
+
+        query = np.asarray(query, dtype=np.float32)
+        with self._lock:
+            size = matrix.size
+            scores = matrix.scores(query)
+            chunk_ids = matrix.chunk_ids[:size].copy()
+            sources = matrix.sources[:size].copy()
+
+        results = []
+        for index, source in enumerate(SOURCES):
+            positions = np.flatnonzero(sources == index)
+            best = positions[_top_k(scores[positions], chunk_ids[positions], limits.get(source, 0))]
+            results.extend((int(chunk_ids[i]), source, float(scores[i])) for i in best)
+        return results
+
+    def add(self, user_id: int, rows: list[tuple]):
+        """Append committed chunks to a loaded (or loading) user's matrix."""
+        with self._lock:
+            if user_id in self._loading:
+                self._loading[user_id].extend(rows)
+                return
+            matrix = self._users.get(user_id)
+            if matrix is not None:
+                matrix.add(rows)
+                self._evict()
+
+    def invalidate(self, user_id: int = None):
+        with self._lock:
+            if user_id is None:
+                self._users.clear()
+            else:
+                self._users.pop(user_id, None)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["users"] = len(self._users)
+            stats["memory_bytes"] = sum(matrix.nbytes for matrix in self._users.values())
+        return stats
+
+
+local_index = LocalVectorIndex()
+
+_PENDING_KEY = "local_vector_index_pending"
+_listeners_enabled = False
+
+
+def _queue_new_chunks(session, flush_context):
+    # Captured now: attributes are expired by the time after_commit runs
+    pending = session.info.setdefault(_PENDING_KEY, {})
+    for obj in session.new:
+        if isinstance(obj, DocumentChunk) and obj.embedding is not None:
+            source = 0 if obj.contact_note_id is None else 1
+            pending.setdefault(obj.user_id, []).append((obj.id, source, obj.embedding))
+
+
+def queue_inserted_chunks(session, user_id: int, rows: list[tuple]):
+    """
+    Append chunks a bulk INSERT wrote through session when it commits.
+
+    Core inserts create no ORM objects, so after_flush never sees them.
+
+    Args:
+        rows (list[tuple]): (chunk_id, source index, vector) rows, as in _UserMatrix.add.
+    """
+    if _listeners_enabled:
+        session.info.setdefault(_PENDING_KEY, {}).setdefault(user_id, []).extend(rows)
+
+
+def _apply_new_chunks(session):
+    for user_id, rows in session.info.pop(_PENDING_KEY, {}).items():
+        local_index.add(user_id, rows)
+
+
+def _discard_new_chunks(session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+def enable_incremental_updates():
+    """Keep loaded matrices current by appending chunks as their sessions commit."""
+    global _listeners_enabled
+    if _listeners_enabled:
+        return
+    # session.new still holds the flushed objects (with ids) in after_flush
+    event.listen(Session, "after_flush", _queue_new_chunks)
+    event.listen(Session, "after_commit", _apply_new_chunks)
+    event.listen(Session, "after_rollback", _discard_new_chunks)
+    _listeners_enabled = True
+
+
+def get_local_index_stats() -> dict:
+    return local_index.get_stats()
@@ -0,0 +1,16 @@
+import tiktoken
+from functools import lru_cache
+
+
+# Load each tokenizer once per process and reuse it everywhere
+@lru_cache(maxsize=None)
+def get_encoding(model: str = "text-embedding-3-small"):
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        # Unknown model names fall back to the encoding used by current OpenAI models
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def count_tokens(text: str, model: str = "text-embedding-3-small") -> int:
+    return len(get_encoding(model).encode(text or ""))
@@ -3,6 +3,12 @@ from app.api.auth import auth_router
 from app.api.chat import chat_router
 from app.api.tasks import tasks_router
 from app.api.webhook import webhook_router
+from app.api.emails import emails_router
+from app.services.gmail_backfill import resume_backfills
+from app.services.embedding import get_embedding_cache_stats
+from app.services.google_client import get_google_client_stats
+from app.services.vector_index import get_local_index_stats
+from app.core.tool_cache import get_tool_cache_stats
 
 import os
 from dotenv import load_dotenv
@@ -32,3 +38,24 @@ app.include_router(auth_router)
 app.include_router(chat_router)
 app.include_router(tasks_router)
 app.include_router(webhook_router)
+app.include_router(emails_router)
+
+
+@app.on_event("startup")
+def resume_gmail_backfills():
+    # Pick up backfills interrupted by the last shutdown
+    resume_backfills()
+
+
+@app.get("/health")
+def health():
+    """Liveness check, with hit/miss counters of the in-process caches."""
+    return {
+        "status": "ok",
+        "caches": {
+            "embeddings": get_embedding_cache_stats(),
+            "tools": get_tool_cache_stats(),
+            "google_clients": get_google_client_stats(),
+            "local_index": get_local_index_stats(),
+        },
+    }
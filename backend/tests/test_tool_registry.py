@@ -0,0 +1,40 @@
+import inspect
+
+import pytest
+
+pytest.importorskip("pydantic")
+
+from app.core.tool_registry import INJECTED_ARGS, TOOL_REGISTRY, tool
+
+
+def _model_params(func) -> list:
+    return [
+        param.name for param in inspect.signature(func).parameters.values()
+        if param.name not in INJECTED_ARGS
+        and param.kind not in (inspect.Parameter.VAR_POSITIONAL, inspect.Parameter.VAR_KEYWORD)
+    ]
+
+
+def test_parameter_named_title_is_kept():
+    @tool("Test tool", name="_test_titled")
+    def titled(title: str, start: str, user_id: int = None, db=None):
+        return title
+
+    try:
+        parameters = TOOL_REGISTRY["_test_titled"].schema["parameters"]
+        assert "title" not in parameters
+        assert set(parameters["properties"]) == {"title", "start"}
+        assert "title" not in parameters["properties"]["start"]
+        assert parameters["required"] == ["title", "start"]
+    finally:
+        del TOOL_REGISTRY["_test_titled"]
+
+
+def test_every_parameter_is_in_its_schema():
+    # Registers the app's tools; needs the service dependencies installed
+    pytest.importorskip("app.core.tool_agent")
+    assert TOOL_REGISTRY
+    for name, spec in TOOL_REGISTRY.items():
+        properties = spec.schema["parameters"]["properties"]
+        for param in _model_params(spec.func):
+            assert param in properties, f"{name}: {param} missing from schema"
@@ -0,0 +1,39 @@
+from types import SimpleNamespace
+
+from app.core.turn_scheduler import FINAL_ANSWER_NOTE, TurnScheduler
+
+
+def _run_tool_loop(scheduler: TurnScheduler) -> int:
+    """Drive the scheduler like chat() with a model that always calls tools; return the call count."""
+    messages = []
+    calls = 0
+    while True:
+        scheduler.next_round(messages)
+        calls += 1
+        scheduler.llm_done(SimpleNamespace(prompt_tokens=10, completion_tokens=5, total_tokens=15))
+        if scheduler.final:
+            return calls
+        scheduler.tools_done([{"tool": "find_contact"}])
+
+
+def test_max_rounds_caps_model_calls():
+    scheduler = TurnScheduler(max_rounds=6, token_budget=10**9, deadline=3600)
+    assert _run_tool_loop(scheduler) == 6
+    assert scheduler.stop_reason == "max_rounds"
+    assert len(scheduler.rounds) == 6
+
+
+def test_single_round_is_final():
+    scheduler = TurnScheduler(max_rounds=1, token_budget=10**9, deadline=3600)
+    messages = []
+    options = scheduler.next_round(messages)
+    assert scheduler.final
+    assert options["tool_choice"] == "none"
+    assert messages == [{"role": "system", "content": FINAL_ANSWER_NOTE}]
+
+
+def test_token_budget_forces_final_round():
+    scheduler = TurnScheduler(max_rounds=100, token_budget=30, deadline=3600)
+    # Two rounds use the 30-token budget; the third gets no tools
+    assert _run_tool_loop(scheduler) == 3
+    assert scheduler.stop_reason == "token_budget"